@@ -1,6 +1,9 @@
 import numpy as np
 
-from .. import WimObject, WimList, WimTuple, WimNone, Meta
+from typing import List, Tuple
+
+from .. import WimObject, WimList, WimTuple, WimNone, WimException, Meta
+from ..indexing import IdIndex, morton_codes
 
 class Process(WimObject):
     def __init__(self, xaxis=None, zaxis=None):
@@ -24,6 +27,57 @@ class Node(WimObject):
     def __to_dict__(self):
         return [self.id, self.x, self.y, self.z]
 
+def _as_array(a, dtype, shape) -> np.ndarray:
+    '''
+    Returns a as an array of dtype, reshaped if it does not have the number of
+    dimensions of shape. Arrays of the right type and dimensions are returned as is.
+    '''
+    a = np.asarray(a if a is not None else [], dtype=dtype)
+    return a if a.ndim == len(shape) else a.reshape(shape)
+
+class NodeArray(WimObject):
+    '''
+    Nodes stored as an (N,) array of ids and an (N, 3) array of coordinates,
+    serialized like a WimList of Node. The arrays are used as given when they
+    already have the right type, and iterating creates Node objects.
+    '''
+    def __init__(self, ids=None, coordinates=None):
+        self.ids = _as_array(ids, np.int64, (-1,))
+        self.coordinates = _as_array(coordinates, np.float64, (-1, 3))
+
+        if len(self.ids) != len(self.coordinates):
+            raise ValueError('{} node ids for {} coordinates'.format(len(self.ids), len(self.coordinates)))
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __getitem__(self, i):
+        x, y, z = self.coordinates[i].tolist()
+        return Node(int(self.ids[i]), x, y, z)
+
+    def __iter__(self):
+        for i in range(len(self.ids)):
+            yield self[i]
+
+    def is_empty(self):
+        return len(self.ids) == 0
+
+    @classmethod
+    def FromNodes(cls, nodes) -> 'NodeArray':
+        '''
+        Copies Node objects, or [id, x, y, z] lists as the abaqus translator makes,
+        into a NodeArray
+        '''
+        rows = [n.__to_dict__() if isinstance(n, Node) else n for n in nodes]
+        return cls([r[0] for r in rows], [(r[1], r[2], r[3] if len(r) >= 4 else 0.) for r in rows])
+
+    @classmethod
+    def __from_dict__(cls, d):
+        return cls.FromNodes(d)
+
+    def __to_dict__(self):
+        return [[i, *c] for i, c in zip(self.ids.tolist(), self.coordinates.tolist())]
+
 class Element(WimObject):
     def __init__(self, id, nodes=None):
         self.id = id
@@ -36,16 +90,344 @@ class Element(WimObject):
     def __to_dict__(self):
         return [self.id, *self.nodes]
 
+class ElementArray(WimObject):
+    '''
+    Elements of one type stored as an (M,) array of ids and an (M, K) array of
+    the ids of their K nodes, serialized like a WimList of Element. The arrays
+    are used as given when they already have the right type, and iterating
+    creates Element objects.
+    '''
+    def __init__(self, ids=None, nodes=None):
+        self.ids = _as_array(ids, np.int64, (-1,))
+        self.nodes = _as_array(nodes, np.int64, (len(self.ids), -1) if len(self.ids) > 0 else (0, 0))
+
+        if len(self.ids) != len(self.nodes):
+            raise ValueError('{} element ids for {} elements'.format(len(self.ids), len(self.nodes)))
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __getitem__(self, i):
+        return Element(int(self.ids[i]), self.nodes[i].tolist())
+
+    def __iter__(self):
+        for i in range(len(self.ids)):
+            yield self[i]
+
+    def is_empty(self):
+        return len(self.ids) == 0
+
+    @classmethod
+    def FromElements(cls, elements) -> 'ElementArray':
+        '''
+        Copies Element objects, or [id, n1, n2, ...] lists, into an ElementArray
+        '''
+        rows = [e.__to_dict__() if isinstance(e, Element) else e for e in elements]
+        return cls([r[0] for r in rows], [r[1:] for r in rows])
+
+    @classmethod
+    def __from_dict__(cls, d):
+        return cls.FromElements(d)
+
+    def __to_dict__(self):
+        return np.column_stack((self.ids, self.nodes)).tolist()
+
 class ElementGroup(WimObject):
     def __init__(self, type='PSL4', thickness=1.0):
         self.type = type
         self.thickness = thickness
         self.connectivity = WimList(Element)
 
+class ArrayElementGroup(ElementGroup):
+    '''
+    An ElementGroup with its connectivity in an ElementArray
+    '''
+    def __init__(self, type='PSL4', thickness=1.0, ids=None, nodes=None):
+        super().__init__(type, thickness)
+        self.connectivity = ElementArray(ids, nodes)
+
+class MeshIndex:
+    '''
+    Id to position lookups of the nodes and elements of a Mesh. Node positions
+    index the node arrays and element positions the elements of all groups in
+    order. Compact ids are looked up in dense arrays and other ids through a
+    sorted copy, see indexing.IdIndex. Node and Element objects are copied
+    into arrays, the arrays of an ArrayMesh are used as they are.
+
+    An index stays valid while the id arrays of an ArrayMesh hold the same ids
+    and the lists of a Mesh hold as many nodes and elements. Node and Element
+    objects changed in place are not detected, see Mesh.index.
+    '''
+    def __init__(self, mesh: 'Mesh'):
+        nodes = mesh.nodes
+        self.nodes = nodes if isinstance(nodes, NodeArray) else NodeArray.FromNodes(nodes)
+
+        self.groups = [
+            g.connectivity if isinstance(g.connectivity, ElementArray) else ElementArray.FromElements(g.connectivity)
+            for g in mesh.elements
+        ]
+
+        self.group_ptr = np.cumsum([0] + [len(c) for c in self.groups], dtype=np.int64)
+        self.element_ids = np.concatenate([c.ids for c in self.groups] + [np.empty(0, dtype=np.int64)])
+
+        # The id arrays are copied to notice ids changed in place
+        self._key = [(k, k if isinstance(k, int) else k.copy()) for k in MeshIndex._mesh_key(mesh)]
+        self._node_lookup = IdIndex(self.nodes.ids)
+        self._element_lookup = IdIndex(self.element_ids)
+
+    @staticmethod
+    def _mesh_key(mesh: 'Mesh') -> list:
+        '''
+        Returns what must not change for an index of the mesh to stay valid:
+        the id arrays of an ArrayMesh and the sizes of the lists of a Mesh
+        '''
+        def part(a):
+            return a.ids if isinstance(a, (NodeArray, ElementArray)) else len(a)
+
+        return [part(mesh.nodes)] + [part(g.connectivity) for g in mesh.elements]
+
+    def is_valid(self, mesh: 'Mesh') -> bool:
+        key = MeshIndex._mesh_key(mesh)
+
+        if len(key) != len(self._key):
+            return False
+
+        for current, (indexed, snapshot) in zip(key, self._key):
+            if isinstance(current, int):
+                if current != indexed:
+                    return False
+            elif current is not indexed or not np.array_equal(current, snapshot):
+                return False
+
+        return True
+
+    def node_positions(self, ids) -> np.ndarray:
+        '''
+        Returns the position of each node id, or -1 for ids that are not in the mesh
+        '''
+        return self._node_lookup.find(ids)
+
+    def element_positions(self, ids) -> Tuple[np.ndarray, np.ndarray]:
+        '''
+        Returns the group and the row in the group of each element id, both -1
+        for ids that are not in the mesh
+        '''
+        positions = self._element_lookup.find(ids)
+        group = np.searchsorted(self.group_ptr, positions, side='right') - 1
+        group[positions < 0] = -1
+        return group, np.where(positions < 0, -1, positions - self.group_ptr[np.maximum(group, 0)])
+
 class Mesh(WimObject):
     def __init__(self):
         self.nodes = WimList(Node)
         self.elements = WimList(ElementGroup)
+        self._index = None
+
+    def index(self, rebuild=False) -> MeshIndex:
+        '''
+        Returns the MeshIndex of the nodes and elements, built again when nodes,
+        elements or arrays have been added or replaced, or the ids of an
+        ArrayMesh changed, since the last call. Pass rebuild=True after changing
+        the ids, coordinates or nodes of Node and Element objects in place.
+        '''
+        index = self.__dict__.get('_index')
+
+        if rebuild or index is None or not index.is_valid(self):
+            index = MeshIndex(self)
+            self._index = index
+
+        return index
+
+    def is_empty(self):
+        return self.nodes.is_empty() and self.elements.is_empty()
+
+    def _node_positions(self, ids) -> np.ndarray:
+        ids = np.asarray(ids, dtype=np.int64).reshape(-1)
+        positions = self.index().node_positions(ids)
+
+        if (positions < 0).any():
+            raise WimException('Nodes {} are not in the mesh'.format(ids[positions < 0].tolist()))
+
+        return positions
+
+    def _element_positions(self, ids) -> Tuple[np.ndarray, np.ndarray]:
+        ids = np.asarray(ids, dtype=np.int64).reshape(-1)
+        group, row = self.index().element_positions(ids)
+
+        if (group < 0).any():
+            raise WimException('Elements {} are not in the mesh'.format(ids[group < 0].tolist()))
+
+        return group, row
+
+    def elements_of(self, elements) -> List[Tuple['ElementGroup', np.ndarray, np.ndarray]]:
+        '''
+        Returns the element group, the element ids and the (M, K) node ids of
+        the elements of an ElementSet or list of element ids, for each group
+        with elements in the set
+        '''
+        if isinstance(elements, ElementSet):
+            elements = elements.elements
+
+        index = self.index()
+        ids = np.asarray(elements, dtype=np.int64).reshape(-1)
+        group, row = self._element_positions(ids)
+
+        order = np.argsort(group, kind='stable')
+        bounds = np.searchsorted(group[order], np.arange(len(index.groups) + 1))
+
+        found = []
+        for g, (start, end) in enumerate(zip(bounds[:-1].tolist(), bounds[1:].tolist())):
+            if start < end:
+                rows = row[order[start:end]]
+                found.append((self.elements[g], index.groups[g].ids[rows], index.groups[g].nodes[rows]))
+
+        return found
+
+    def _region_nodes(self, region) -> Tuple[np.ndarray, np.ndarray]:
+        '''
+        Returns the node ids of nodes_of and their positions
+        '''
+        if isinstance(region, ElementSet):
+            connectivity = [nodes.reshape(-1) for _, _, nodes in self.elements_of(region)]
+            ids = np.unique(np.concatenate(connectivity + [np.empty(0, dtype=np.int64)]))
+        else:
+            if isinstance(region, NodeSet):
+                region = region.nodes
+
+            ids = np.asarray(region, dtype=np.int64).reshape(-1)
+
+        return ids, self._node_positions(ids)
+
+    def nodes_of(self, region) -> np.ndarray:
+        '''
+        Returns the node ids of a NodeSet or list of node ids, or the sorted ids
+        of the nodes of the elements of an ElementSet
+        '''
+        return self._region_nodes(region)[0]
+
+    def coordinates_of(self, region) -> np.ndarray:
+        '''
+        Returns the (N, 3) coordinates of the nodes in the order of nodes_of
+        '''
+        return self.index().nodes.coordinates[self._region_nodes(region)[1]]
+
+    def _node_order(self, method: str, connectivity: List[np.ndarray]) -> np.ndarray:
+        '''
+        Returns the node positions in their new order, given the node positions
+        of the elements of each group
+        '''
+        index = self.index()
+        n = len(index.nodes)
+
+        if method == 'morton':
+            return np.argsort(morton_codes(index.nodes.coordinates, uniform=True), kind='stable')
+
+        if method != 'rcm':
+            raise ValueError('Unknown renumbering method {}'.format(method))
+
+        import scipy.sparse
+        import scipy.sparse.csgraph
+
+        # Every pair of nodes that share an element is coupled in the stiffness matrix
+        rows, cols = [], []
+        for c in connectivity:
+            k = c.shape[1]
+            i, j = np.nonzero(~np.eye(k, dtype=bool))
+            rows.append(c[:, i].reshape(-1))
+            cols.append(c[:, j].reshape(-1))
+
+        rows = np.concatenate(rows + [np.empty(0, dtype=np.int64)])
+        cols = np.concatenate(cols + [np.empty(0, dtype=np.int64)])
+
+        graph = scipy.sparse.csr_matrix((np.ones(len(rows), dtype=np.int8), (rows, cols)), shape=(n, n))
+
+        return scipy.sparse.csgraph.reverse_cuthill_mckee(graph, symmetric_mode=True).astype(np.int64)
+
+    def renumber(self, method='rcm') -> Tuple[np.ndarray, np.ndarray]:
+        '''
+        Renumbers the nodes 1 to N in the order of method and the elements 1
+        to M group by group, each group sorted by the lowest new number of its
+        nodes. The method is 'rcm', reverse Cuthill-McKee on the node graph of
+        the elements, or 'morton', the Z-order of the node
+        coordinates. Returns the old node ids and the old element ids in their
+        new order, so the node numbered i was numbered node_ids[i - 1] before.
+        Node and element sets are not rewritten here, see Model.renumber.
+        '''
+        index = self.index()
+        connectivity = [
+            self._node_positions(g.nodes).reshape(g.nodes.shape) for g in index.groups
+        ]
+
+        order = self._node_order(method, connectivity)
+
+        new_ids = np.empty(len(order), dtype=np.int64)
+        new_ids[order] = np.arange(1, len(order) + 1, dtype=np.int64)
+
+        node_ids = index.nodes.ids[order]
+        coordinates = index.nodes.coordinates[order]
+
+        if isinstance(self.nodes, NodeArray):
+            self.nodes = NodeArray(np.arange(1, len(order) + 1, dtype=np.int64), coordinates)
+        else:
+            self.nodes[:] = [Node(i, *c) for i, c in enumerate(coordinates.tolist(), 1)]
+
+        element_ids = []
+        first = 1
+        for g, old, c in zip(self.elements, index.groups, connectivity):
+            nodes = new_ids[c]
+            rows = np.argsort(nodes.min(axis=1), kind='stable') if nodes.shape[1] > 0 else np.arange(len(nodes))
+
+            element_ids.append(old.ids[rows])
+
+            ids = np.arange(first, first + len(rows), dtype=np.int64)
+            first += len(rows)
+
+            if isinstance(g.connectivity, ElementArray):
+                g.connectivity = ElementArray(ids, nodes[rows])
+            else:
+                g.connectivity[:] = [Element(i, e) for i, e in zip(ids.tolist(), nodes[rows].tolist())]
+
+        self._index = None
+
+        return node_ids, np.concatenate(element_ids + [np.empty(0, dtype=np.int64)])
+
+class ArrayMesh(Mesh):
+    '''
+    A Mesh with its nodes in a NodeArray and the connectivity of each element
+    group in an ElementArray. It serializes to the same JSON as a Mesh, and
+    ArrayMesh.from_dict reads the mesh of a model straight into arrays.
+    '''
+    def __init__(self, ids=None, coordinates=None):
+        super().__init__()
+        self.nodes = NodeArray(ids, coordinates)
+        self.elements = WimList(ArrayElementGroup)
+
+    @classmethod
+    def FromMesh(cls, mesh: Mesh) -> 'ArrayMesh':
+        '''
+        Copies the nodes and elements of a Mesh into arrays
+        '''
+        if isinstance(mesh, ArrayMesh):
+            return mesh
+
+        array_mesh = cls()
+        array_mesh.nodes = NodeArray.FromNodes(mesh.nodes)
+
+        for g in mesh.elements:
+            group = ArrayElementGroup(g.type, g.thickness)
+            group.connectivity = ElementArray.FromElements(g.connectivity)
+            array_mesh.elements.append(group)
+
+        return array_mesh
+
+    def add_group(self, type, ids, nodes, thickness=1.0) -> ArrayElementGroup:
+        '''
+        Adds a group of elements of the given type with the (M,) element ids
+        and (M, K) node ids
+        '''
+        group = ArrayElementGroup(type, thickness, ids, nodes)
+        self.elements.append(group)
+        return group
 
 class NodeSet(WimObject):
     def __init__(self, name=None, nodes=None):
@@ -405,3 +787,51 @@ class Model(WimObject):
         self.outputs = WimList(Output)
         self.jobs = WimList(micro.Job)
         self.manufacturing = Manufacturing()
+
+    def renumber(self, method='rcm') -> Tuple[np.ndarray, np.ndarray]:
+        '''
+        Renumbers the mesh with Mesh.renumber to reduce the bandwidth of the
+        stiffness matrix and rewrites the node, element and surface sets and the
+        nodes of the constraint equations to match. Boundary conditions and loads
+        refer to sets by name and need no change. Returns the old node ids and
+        old element ids in their new order to map results back. Raises a
+        WimException, and changes nothing, when a set or equation refers to an
+        id that is not in the mesh.
+        '''
+        mesh = self.mesh
+        index = mesh.index()
+
+        def element_positions(ids):
+            group, row = mesh._element_positions(ids)
+            return index.group_ptr[group] + row
+
+        # Every id is resolved before anything changes, so an unknown id leaves
+        # the model as it was
+        node_sets = [mesh._node_positions(s.nodes) for s in self.regions.node_sets]
+        element_sets = [element_positions(s.elements) for s in self.regions.element_sets]
+        surface_sets = [[element_positions(f.elements) for f in s.faces] for s in self.regions.surface_sets]
+        equations = [mesh._node_positions([t[0] for t in eq.terms]) for eq in self.constraints.equations]
+
+        old_node_ids = index.nodes.ids
+        old_element_ids = index.element_ids
+
+        node_ids, element_ids = mesh.renumber(method)
+
+        # The new id of the node or element at each old position
+        new_node_ids = IdIndex(node_ids).find(old_node_ids) + 1
+        new_element_ids = IdIndex(element_ids).find(old_element_ids) + 1
+
+        for s, positions in zip(self.regions.node_sets, node_sets):
+            s.nodes[:] = new_node_ids[positions].tolist()
+
+        for s, positions in zip(self.regions.element_sets, element_sets):
+            s.elements[:] = new_element_ids[positions].tolist()
+
+        for s, faces in zip(self.regions.surface_sets, surface_sets):
+            for f, positions in zip(s.faces, faces):
+                f.elements[:] = new_element_ids[positions].tolist()
+
+        for eq, positions in zip(self.constraints.equations, equations):
+            eq.terms[:] = [[n, t[1], t[2]] for n, t in zip(new_node_ids[positions].tolist(), eq.terms)]
+
+        return node_ids, element_ids
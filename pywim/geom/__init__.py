@@ -465,7 +465,7 @@ class Vector(object):
             better performance. If either one is not, the incorrect
             angle will be returned.
         '''
-        return math.acos( min(1., self.dot(u)) )
+        return math.acos( max(-1., min(1., self.dot(u))) )
 
     def point(self, length, origin=None):
         if origin is None:
@@ -817,4 +817,4 @@ class Cuboid(Shape):
             Plane(Vector(0., 0., 1.), self.center + Vertex(0., 0., 0.5 * self.thickness))
         )
 
-from . import tri
+from . import cache, tri
@@ -0,0 +1,361 @@
+'''
+Benchmarks of pywim.geom.tri on generated meshes. Run with
+
+    python -m pywim.geom.benchmark [MAX_TRIANGLES] [SHAPE ...]
+
+to time reading, analyzing and selecting faces on every shape at every size
+in SIZES up to MAX_TRIANGLES.
+'''
+import collections
+import math
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy
+
+from typing import Callable, Dict, List, Tuple
+
+from . import Plane, Vector, tri
+
+SIZES = (1000, 10000, 100000, 1000000, 5000000)
+
+# Triangles of the shapes used as selection seeds
+SEED_COUNT = 8
+
+def _weld(positions: numpy.ndarray, triangle_vertices: numpy.ndarray, precision=6) -> Tuple[numpy.ndarray, numpy.ndarray]:
+    '''
+    Combines vertices at the same location, as Mesh.analyze_mesh does
+    '''
+    group_first = tri._first_of_equal_rows(numpy.rint(positions * 10. ** precision).astype(numpy.int64))
+    keep, inverse = numpy.unique(group_first, return_inverse=True)
+    return positions[keep], inverse.reshape(-1)[triangle_vertices]
+
+def _grid(n: int) -> Tuple[numpy.ndarray, numpy.ndarray, numpy.ndarray]:
+    '''
+    Returns the u and v coordinates of the vertices of an n by n grid of
+    squares over the unit square and its triangles, counter-clockwise in u, v
+    '''
+    g = numpy.linspace(0., 1., n + 1)
+    u, v = [a.reshape(-1) for a in numpy.meshgrid(g, g, indexing='ij')]
+    c = (numpy.arange(n)[:, None] * (n + 1) + numpy.arange(n)).reshape(-1)
+
+    triangles = numpy.concatenate((
+        numpy.column_stack((c, c + n + 1, c + 1)),
+        numpy.column_stack((c + 1, c + n + 1, c + n + 2)),
+    ))
+
+    return u, v, triangles
+
+def box(ntris: int, size=(100., 60., 20.)) -> Tuple[numpy.ndarray, numpy.ndarray]:
+    '''
+    Box with every side split into n by n squares, 12 * n ** 2 triangles
+    '''
+    n = max(1, round(math.sqrt(ntris / 12.)))
+
+    u, v, grid = _grid(n)
+    zero = numpy.zeros_like(u)
+    one = numpy.ones_like(u)
+
+    positions = []
+    triangles = []
+
+    for side in ((v, u, zero), (u, v, one), (u, zero, v), (v, one, u), (zero, v, u), (one, u, v)):
+        triangles.append(grid + len(positions) * len(u))
+        positions.append(numpy.column_stack(side))
+
+    return _weld(numpy.concatenate(positions) * numpy.asarray(size), numpy.concatenate(triangles))
+
+def cylinder(ntris: int, segments=64, radius=10., height=40.) -> Tuple[numpy.ndarray, numpy.ndarray]:
+    '''
+    Closed cylinder along z with segments around, as many rows of segments
+    along z as give about ntris triangles, and a triangle fan on each end
+    '''
+    rows = max(1, round((ntris - 2 * segments) / (2. * segments)))
+
+    angle = 2. * math.pi * numpy.arange(segments) / segments
+    z = numpy.linspace(0., height, rows + 1)
+
+    positions = numpy.concatenate((
+        numpy.column_stack((
+            numpy.tile(radius * numpy.cos(angle), rows + 1),
+            numpy.tile(radius * numpy.sin(angle), rows + 1),
+            numpy.repeat(z, segments),
+        )),
+        [(0., 0., 0.), (0., 0., height)],
+    ))
+
+    r = numpy.repeat(numpy.arange(rows), segments)
+    j = numpy.tile(numpy.arange(segments), rows)
+    v00 = r * segments + j
+    v01 = r * segments + (j + 1) % segments
+    v10 = v00 + segments
+    v11 = v01 + segments
+
+    j = numpy.arange(segments)
+    bottom = numpy.full(segments, len(positions) - 2)
+    top = numpy.full(segments, len(positions) - 1)
+
+    return positions, numpy.concatenate((
+        numpy.column_stack((v00, v01, v11)),
+        numpy.column_stack((v00, v11, v10)),
+        numpy.column_stack((bottom, (j + 1) % segments, j)),
+        numpy.column_stack((top, rows * segments + j, rows * segments + (j + 1) % segments)),
+    ))
+
+def _square_loop(m: int) -> numpy.ndarray:
+    '''
+    4 * m points counter-clockwise around the square with corners at (+-1, +-1),
+    starting at (1, -1)
+    '''
+    corners = numpy.array([(1., -1.), (1., 1.), (-1., 1.), (-1., -1.), (1., -1.)])
+    t = (numpy.arange(m) / m)[:, None]
+    return numpy.concatenate([corners[s] + t * (corners[s + 1] - corners[s]) for s in range(4)])
+
+def _wall(bottom: numpy.ndarray, top: numpy.ndarray) -> numpy.ndarray:
+    '''
+    Triangles between two closed loops of vertex indices, facing outwards of
+    counter-clockwise loops when looking from top down to bottom
+    '''
+    b1 = numpy.roll(bottom, -1)
+    t1 = numpy.roll(top, -1)
+    return numpy.concatenate((
+        numpy.column_stack((bottom, b1, t1)),
+        numpy.column_stack((bottom, t1, top)),
+    ))
+
+def perforated_plate(ntris: int, holes=4, size=100., thickness=5., hole_ratio=0.5) -> Tuple[numpy.ndarray, numpy.ndarray]:
+    '''
+    Square plate with holes by holes round through holes. Each cell of the
+    plate is split into 4 * m segments around its hole, 24 * m triangles per
+    cell and 8 * m * holes on the outside of the plate.
+    '''
+    m = max(2, round(ntris / (24. * holes ** 2 + 8. * holes)))
+
+    cell = size / holes
+    square = 0.5 * cell * _square_loop(m)
+    angle = numpy.arctan2(square[:, 1], square[:, 0])
+    circle = 0.5 * cell * hole_ratio * numpy.column_stack((numpy.cos(angle), numpy.sin(angle)))
+
+    n = len(square)
+    loop = numpy.arange(n)
+    nxt = (loop + 1) % n
+
+    # Vertices of a cell: square bottom, square top, circle bottom, circle top
+    cell_positions = numpy.concatenate([
+        numpy.column_stack((xy, numpy.full(n, z)))
+        for xy, z in ((square, 0.), (square, thickness), (circle, 0.), (circle, thickness))
+    ])
+    sb, st, cb, ct = loop, loop + n, loop + 2 * n, loop + 3 * n
+
+    cell_triangles = numpy.concatenate((
+        # Top and bottom
+        numpy.column_stack((ct, st, st[nxt])),
+        numpy.column_stack((ct, st[nxt], ct[nxt])),
+        numpy.column_stack((cb, sb[nxt], sb)),
+        numpy.column_stack((cb, cb[nxt], sb[nxt])),
+        # Hole
+        _wall(ct, cb),
+    ))
+
+    centers = (numpy.arange(holes) + 0.5) * cell
+    cx, cy = [a.reshape(-1) for a in numpy.meshgrid(centers, centers, indexing='ij')]
+
+    positions = [cell_positions + (x, y, 0.) for x, y in zip(cx, cy)]
+    triangles = [cell_triangles + k * len(cell_positions) for k in range(len(cx))]
+
+    # Outside of the plate
+    outline = 0.5 * size * (_square_loop(m * holes) + 1.)
+    k = len(cx) * len(cell_positions)
+    positions.append(numpy.column_stack((outline, numpy.zeros(len(outline)))))
+    positions.append(numpy.column_stack((outline, numpy.full(len(outline), thickness))))
+    triangles.append(_wall(k + numpy.arange(len(outline)), k + len(outline) + numpy.arange(len(outline))))
+
+    return _weld(numpy.concatenate(positions), numpy.concatenate(triangles))
+
+def noisy_scan(ntris: int, noise=0.2, seed=0) -> Tuple[numpy.ndarray, numpy.ndarray]:
+    '''
+    box with every vertex moved randomly by up to noise times the length of
+    the grid squares, like the irregular, near-coplanar triangles of a scan
+    '''
+    positions, triangles = box(ntris)
+
+    spacing = numpy.linalg.norm(positions[triangles[0, 1]] - positions[triangles[0, 0]])
+    rng = numpy.random.default_rng(seed)
+
+    return positions + rng.uniform(-noise * spacing, noise * spacing, positions.shape), triangles
+
+SHAPES = {
+    'box': box,
+    'cylinder': cylinder,
+    'plate': perforated_plate,
+    'scan': noisy_scan,
+}
+
+class Result:
+    '''
+    Time and peak memory allocated by one operation on a mesh of a shape
+    '''
+    def __init__(self, shape: str, triangles: int, operation: str, seconds: float, peak: int):
+        self.shape = shape
+        self.triangles = triangles
+        self.operation = operation
+        self.seconds = seconds
+        self.peak = peak
+
+    @property
+    def throughput(self) -> float:
+        '''
+        Triangles of the mesh per second
+        '''
+        return self.triangles / self.seconds if self.seconds > 0. else math.inf
+
+    HEADER = '{:<10}{:>10}  {:<34}{:>12}{:>17}{:>13}'.format(
+        'shape', 'triangles', 'operation', 'time', 'throughput', 'peak memory'
+    )
+
+    def __str__(self):
+        return '{:<10}{:>10}  {:<34}{:>10.4f} s{:>10.2f} Mtri/s{:>10.1f} MB'.format(
+            self.shape,
+            self.triangles,
+            self.operation,
+            self.seconds,
+            self.throughput * 1e-6,
+            self.peak / 2. ** 20
+        )
+
+def _measure(operation: Callable[[], object], trace_memory: bool) -> Tuple[float, int]:
+    '''
+    Returns the run time of operation and the peak memory it allocated
+    '''
+    if trace_memory:
+        tracemalloc.start()
+
+    try:
+        start = time.perf_counter()
+        operation()
+        seconds = time.perf_counter() - start
+
+        peak = tracemalloc.get_traced_memory()[1] if trace_memory else 0
+    finally:
+        if trace_memory:
+            tracemalloc.stop()
+
+    return seconds, peak
+
+def _write_stl(path: str, positions: numpy.ndarray, triangles: numpy.ndarray):
+    records = numpy.zeros(len(triangles), dtype=tri.STL_DTYPE)
+    records['vectors'] = positions[triangles]
+
+    with open(path, 'wb') as f:
+        f.write(bytes(80))
+        f.write(numpy.uint32(len(records)).tobytes())
+        records.tofile(f)
+
+def _operations(mesh: tri.Mesh, seeds: numpy.ndarray) -> Dict[str, Callable[[], object]]:
+    '''
+    Selections timed on an analyzed mesh, each for all seeds. The first
+    selection of a kind also builds the labels or indexes it uses.
+    '''
+    ids = mesh.triangle_ids[seeds]
+    plane = Plane(Vector(0., 0., 1.))
+
+    def each(select):
+        return lambda: [select(int(t)) for t in ids]
+
+    return collections.OrderedDict([
+        ('select_planar_face', each(mesh.select_planar_face)),
+        ('select_face_by_edge_angle', each(lambda t: mesh.select_face_by_edge_angle(t, math.pi / 12.))),
+        ('select_concave_face', each(mesh.select_concave_face)),
+        ('select_convex_face', each(mesh.select_convex_face)),
+        ('select_face_by_normals_in_plane', each(lambda t: mesh.select_face_by_normals_in_plane(t, plane))),
+        ('try_select_cylinder_face', each(mesh.try_select_cylinder_face)),
+        ('select_cylinder', each(mesh.select_cylinder)),
+        ('select_segment_face', each(mesh.select_segment_face)),
+        ('triangles_in_parallel_plane', each(mesh.triangles_in_parallel_plane)),
+        ('select_planar_faces', lambda: mesh.select_planar_faces(ids)),
+        ('select_faces_by_edge_angle', lambda: mesh.select_faces_by_edge_angle(ids, math.pi / 12.)),
+        ('select_concave_faces', lambda: mesh.select_concave_faces(ids)),
+        ('select_convex_faces', lambda: mesh.select_convex_faces(ids)),
+        ('select_cylinders', lambda: mesh.select_cylinders(ids)),
+        ('face_from_ids', lambda: mesh.face_from_ids(mesh.triangle_ids[::2])),
+    ])
+
+def benchmark(
+    shape: str,
+    ntris: int,
+    trace_memory: bool = True,
+    report: Callable[[Result], None] = None
+) -> List[Result]:
+    '''
+    Times reading a binary STL of the shape with about ntris triangles,
+    analyzing it and every selection, and returns a Result for each
+    '''
+    positions, triangles = SHAPES[shape](ntris)
+    count = len(triangles)
+
+    results = []
+
+    def run(name, operation):
+        result = Result(shape, count, name, *_measure(operation, trace_memory))
+        results.append(result)
+        if report:
+            report(result)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, shape + '.stl')
+        _write_stl(path, positions, triangles)
+
+        meshes = []
+        run('FromSTL', lambda: meshes.append(tri.Mesh.FromSTL(path, analyze_mesh=False)))
+
+        mesh = meshes[0]
+        run('analyze_mesh', mesh.analyze_mesh)
+
+    seeds = numpy.linspace(0, len(mesh.triangle_ids) - 1, SEED_COUNT).astype(numpy.int64)
+
+    for name, operation in _operations(mesh, seeds).items():
+        run(name, operation)
+
+    return results
+
+def run(
+    max_triangles: int = SIZES[-1],
+    shapes: List[str] = None,
+    trace_memory: bool = True,
+    report: Callable[[Result], None] = None
+) -> List[Result]:
+    '''
+    Runs benchmark for every shape, default all of SHAPES, at every size in
+    SIZES up to max_triangles
+    '''
+    results = []
+
+    for shape in shapes or SHAPES:
+        for ntris in SIZES:
+            if ntris <= max_triangles:
+                results.extend(benchmark(shape, ntris, trace_memory, report))
+
+    return results
+
+def main():
+    args = sys.argv[1:]
+
+    if any(a not in SHAPES and not a.isdigit() for a in args):
+        return usage()
+
+    sizes = [int(a) for a in args if a.isdigit()]
+    shapes = [a for a in args if a in SHAPES]
+
+    print(Result.HEADER)
+    run(sizes[0] if sizes else SIZES[-1], shapes, report=print)
+
+def usage():
+    print('Usage:')
+    print('{} [MAX_TRIANGLES] [SHAPE ...]'.format(sys.argv[0]))
+    print('Shapes: {}'.format(', '.join(SHAPES)))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,217 @@
+import collections
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+
+import numpy
+
+from typing import Dict, Optional
+
+from . import tri
+
+def _json_scalar(o):
+    # numpy scalars are keyed like the Python scalar of the same value
+    if isinstance(o, numpy.generic):
+        return o.item()
+    raise TypeError('{} is not JSON serializable'.format(type(o).__name__))
+
+class MeshCache:
+    '''
+    Keeps the arrays of analyzed tri.Mesh objects on disk so a mesh that was
+    analyzed before is opened instead of analyzed again. Each mesh is stored in
+    its own sub-directory of directory as .npy files, named by a hash of the
+    input arrays and the analysis arguments, and is opened with memory mapped
+    arrays. When the stored meshes take more than max_size bytes the least
+    recently used ones are removed.
+    '''
+
+    # Changes whenever the stored arrays or the analysis results change
+    VERSION = 1
+
+    _META_FILE = 'mesh.json'
+
+    def __init__(self, directory: str, max_size: int = 1 << 30):
+        self.directory = directory
+        self.max_size = max_size
+
+        os.makedirs(directory, exist_ok=True)
+
+    def key(self, *arrays, **analyze_args) -> str:
+        '''
+        Returns the cache key of the given input arrays and analyze_mesh arguments
+        '''
+        h = hashlib.sha256()
+
+        h.update(json.dumps([MeshCache.VERSION, sorted(analyze_args.items())], default=_json_scalar).encode())
+
+        for a in arrays:
+            if a is None:
+                h.update(b'None')
+                continue
+
+            a = numpy.ascontiguousarray(a)
+            h.update('{}{}'.format(a.dtype.str, a.shape).encode())
+            h.update(a.data)
+
+        return h.hexdigest()
+
+    def from_arrays(
+        self,
+        positions,
+        triangle_vertices,
+        vertex_ids=None,
+        triangle_ids=None,
+        **analyze_args
+    ) -> tri.Mesh:
+        '''
+        Returns an analyzed Mesh, see tri.Mesh.FromArrays and tri.Mesh.analyze_mesh
+        '''
+        key = self.key(positions, triangle_vertices, vertex_ids, triangle_ids, **analyze_args)
+
+        mesh = self.load(key)
+
+        if mesh is None:
+            mesh = tri.Mesh.FromArrays(positions, triangle_vertices, vertex_ids, triangle_ids, analyze_mesh=False)
+            mesh.analyze_mesh(**analyze_args)
+            self.store(key, mesh)
+
+        return mesh
+
+    def from_points(self, points, **analyze_args) -> tri.Mesh:
+        '''
+        Returns an analyzed Mesh, see tri.Mesh.FromPoints and tri.Mesh.analyze_mesh
+        '''
+        key = self.key(points, **analyze_args)
+
+        mesh = self.load(key)
+
+        if mesh is None:
+            mesh = tri.Mesh.FromPoints(points, analyze_mesh=False)
+            mesh.analyze_mesh(**analyze_args)
+            self.store(key, mesh)
+
+        return mesh
+
+    def from_stl(self, stl_mesh, **analyze_args) -> tri.Mesh:
+        '''
+        Returns an analyzed Mesh of a numpy-stl mesh or an STL file path, see tri.Mesh.FromSTL
+        '''
+        if tri._is_path(stl_mesh):
+            return self.from_points(tri.read_stl(stl_mesh), **analyze_args)
+
+        return self.from_points(stl_mesh.points, **analyze_args)
+
+    def load(self, key: str) -> Optional[tri.Mesh]:
+        '''
+        Opens the Mesh stored under key, or returns None if there is none
+        '''
+        path = os.path.join(self.directory, key)
+        meta_path = os.path.join(path, MeshCache._META_FILE)
+
+        try:
+            with open(meta_path, 'r') as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None
+
+        if meta.get('version') != MeshCache.VERSION:
+            return None
+
+        # Another process may evict the entry while it is opened
+        try:
+            arrays = {}
+            for name in meta['arrays']:
+                arrays[name] = numpy.load(os.path.join(path, name + '.npy'), mmap_mode='r')
+
+            # The modification time of the meta file orders entries for eviction
+            os.utime(meta_path)
+        except OSError:
+            return None
+
+        return tri.Mesh.FromAnalysisArrays(arrays, meta['strict_edge_definition'])
+
+    def store(self, key: str, mesh: tri.Mesh):
+        '''
+        Stores the arrays of mesh under key and removes the least recently used
+        meshes if the cache is over max_size
+        '''
+        arrays = mesh.analysis_arrays()
+
+        # Write everything to a temporary directory first so other processes
+        # never see a partially written entry
+        tmp = tempfile.mkdtemp(prefix='.tmp-', dir=self.directory)
+
+        try:
+            for name, a in arrays.items():
+                numpy.save(os.path.join(tmp, name + '.npy'), numpy.ascontiguousarray(a))
+
+            meta = {
+                'version': MeshCache.VERSION,
+                'strict_edge_definition': mesh._strict_edge_definition,
+                'arrays': list(arrays.keys()),
+            }
+
+            with open(os.path.join(tmp, MeshCache._META_FILE), 'w') as f:
+                json.dump(meta, f)
+
+            os.rename(tmp, os.path.join(self.directory, key))
+        except OSError:
+            # Another process stored the same key first
+            shutil.rmtree(tmp, ignore_errors=True)
+
+        self.evict(keep=key)
+
+    def entries(self) -> Dict[str, int]:
+        '''
+        Returns the size in bytes of every stored mesh by key, least recently used first
+        '''
+        entries = []
+
+        for key in os.listdir(self.directory):
+            path = os.path.join(self.directory, key)
+
+            if key.startswith('.') or not os.path.isdir(path):
+                continue
+
+            try:
+                used = os.path.getmtime(os.path.join(path, MeshCache._META_FILE))
+                size = sum(e.stat().st_size for e in os.scandir(path))
+            except OSError:
+                continue
+
+            entries.append((used, key, size))
+
+        return collections.OrderedDict((key, size) for _, key, size in sorted(entries))
+
+    def size(self) -> int:
+        '''
+        Total size in bytes of the stored meshes
+        '''
+        return sum(self.entries().values())
+
+    def evict(self, keep: str = None):
+        '''
+        Removes the least recently used meshes, except keep, until the cache is
+        no larger than max_size
+        '''
+        entries = self.entries()
+        total = sum(entries.values())
+
+        for key, size in entries.items():
+            if total <= self.max_size:
+                break
+
+            if key == keep:
+                continue
+
+            shutil.rmtree(os.path.join(self.directory, key), ignore_errors=True)
+            total -= size
+
+    def clear(self):
+        '''
+        Removes every stored mesh
+        '''
+        for key in self.entries():
+            shutil.rmtree(os.path.join(self.directory, key), ignore_errors=True)
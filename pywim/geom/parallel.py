@@ -0,0 +1,187 @@
+import concurrent.futures
+import os
+
+import numpy
+
+from typing import Dict, List, Tuple
+
+from . import tri
+
+try:
+    from multiprocessing import shared_memory
+except ImportError:
+    # Python < 3.8, analyze_meshes runs in this process
+    shared_memory = None
+
+# Offsets of the arrays packed into a shared memory block are aligned to this many bytes
+_ALIGNMENT = 64
+
+def _mesh_arrays(mesh) -> Tuple[Dict[str, numpy.ndarray], bool]:
+    '''
+    Returns the input arrays for tri.Mesh.FromArrays of a tri.Mesh, a numpy-stl mesh
+    or a 3MF mesh (chop.mesh.Mesh), and whether edges are strictly defined
+    '''
+    if isinstance(mesh, tri.Mesh):
+        return {
+            'positions': mesh.positions,
+            'triangle_vertices': mesh.triangle_vertices,
+            'vertex_ids': mesh.vertex_ids,
+            'triangle_ids': mesh.triangle_ids,
+        }, mesh._strict_edge_definition
+
+    if hasattr(mesh, 'points'):
+        points = numpy.asarray(mesh.points)
+        ntris = points.shape[0]
+
+        return {
+            'positions': points.reshape(-1, 3),
+            'triangle_vertices': numpy.arange(3 * ntris, dtype=numpy.int64).reshape(-1, 3),
+        }, True
+
+    return {
+        'positions': numpy.array([(v.x, v.y, v.z) for v in mesh.vertices], dtype=numpy.float64).reshape(-1, 3),
+        'triangle_vertices': numpy.array([(t.v1, t.v2, t.v3) for t in mesh.triangles], dtype=numpy.int64).reshape(-1, 3),
+    }, True
+
+def _pack(arrays: Dict[str, numpy.ndarray]) -> Tuple['shared_memory.SharedMemory', List[tuple]]:
+    '''
+    Copies arrays into a new shared memory block. Returns the block and the
+    name, dtype, shape and offset of every array in it.
+    '''
+    layout = []
+    size = 0
+
+    for name, a in arrays.items():
+        layout.append((name, a.dtype.str, a.shape, size))
+        size += -(-a.nbytes // _ALIGNMENT) * _ALIGNMENT
+
+    shm = shared_memory.SharedMemory(create=True, size=max(size, 1))
+
+    try:
+        for (name, dtype, shape, offset), a in zip(layout, arrays.values()):
+            numpy.ndarray(shape, dtype=dtype, buffer=shm.buf, offset=offset)[...] = a
+    except:
+        shm.close()
+        shm.unlink()
+        raise
+
+    return shm, layout
+
+def _unpack(shm: 'shared_memory.SharedMemory', layout: List[tuple]) -> Dict[str, numpy.ndarray]:
+    '''
+    Copies the arrays packed by _pack out of shm
+    '''
+    return {
+        name: numpy.ndarray(shape, dtype=dtype, buffer=shm.buf, offset=offset).copy()
+        for name, dtype, shape, offset in layout
+    }
+
+def _analyze_arrays(arrays: Dict[str, numpy.ndarray], strict_edge_definition: bool, analyze_args: dict) -> tri.Mesh:
+    mesh = tri.Mesh.FromArrays(
+        arrays['positions'],
+        arrays['triangle_vertices'],
+        arrays.get('vertex_ids'),
+        arrays.get('triangle_ids'),
+        analyze_mesh=False
+    )
+    mesh._strict_edge_definition = strict_edge_definition
+    mesh.analyze_mesh(**analyze_args)
+
+    return mesh
+
+def _analyze(block: str, layout: List[tuple], strict_edge_definition: bool, analyze_args: dict):
+    '''
+    Analyzes the mesh packed in the shared memory block and returns the name
+    and layout of a new block with the analysis arrays. The caller unlinks it.
+    '''
+    shm = shared_memory.SharedMemory(name=block)
+    try:
+        arrays = _unpack(shm, layout)
+    finally:
+        shm.close()
+
+    mesh = _analyze_arrays(arrays, strict_edge_definition, analyze_args)
+
+    out, out_layout = _pack(mesh.analysis_arrays())
+    out.close()
+
+    return out.name, out_layout
+
+def _release(name: str):
+    '''
+    Unlinks the shared memory block name if it still exists
+    '''
+    try:
+        shm = shared_memory.SharedMemory(name=name)
+    except FileNotFoundError:
+        return
+
+    shm.close()
+    shm.unlink()
+
+def analyze_meshes(meshes, processes: int = None, **analyze_args) -> List[tri.Mesh]:
+    '''
+    Analyzes many meshes in a pool of processes and returns a new, analyzed
+    tri.Mesh for each. meshes may hold tri.Mesh, numpy-stl and chop.mesh.Mesh
+    objects, or be a smartslice.job.Job to analyze all of its chop meshes.
+    analyze_args are passed on to tri.Mesh.analyze_mesh.
+
+    Mesh arrays are sent to and from the processes through shared memory.
+    processes defaults to the number of CPUs, and with one process or mesh,
+    or before Python 3.8 which has no multiprocessing.shared_memory, the
+    analysis runs in this process.
+    '''
+    if hasattr(meshes, 'chop'):
+        meshes = meshes.chop.meshes
+
+    inputs = [_mesh_arrays(m) for m in meshes]
+
+    if processes is None:
+        processes = os.cpu_count() or 1
+
+    processes = min(processes, len(inputs))
+
+    if shared_memory is None:
+        processes = 1
+
+    if processes <= 1:
+        return [_analyze_arrays(arrays, strict, analyze_args) for arrays, strict in inputs]
+
+    blocks = []
+    futures = []
+    results = []
+    released = set()
+
+    try:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=processes) as pool:
+            for arrays, strict in inputs:
+                shm, layout = _pack(arrays)
+                blocks.append(shm)
+                futures.append(pool.submit(_analyze, shm.name, layout, strict, analyze_args))
+
+            for (_, strict), future in zip(inputs, futures):
+                name, layout = future.result()
+
+                shm = shared_memory.SharedMemory(name=name)
+                try:
+                    arrays = _unpack(shm, layout)
+                finally:
+                    shm.close()
+                    shm.unlink()
+                    released.add(name)
+
+                results.append(tri.Mesh.FromAnalysisArrays(arrays, strict))
+    finally:
+        for shm in blocks:
+            shm.close()
+            shm.unlink()
+
+        # Blocks returned by the processes that were not collected because
+        # of a failure. Leaving the pool waited for all of them to finish.
+        for future in futures:
+            if future.done() and not future.cancelled() and future.exception() is None:
+                name = future.result()[0]
+                if name not in released:
+                    _release(name)
+
+    return results
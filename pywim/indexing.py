@@ -0,0 +1,77 @@
+import numpy
+
+class IdIndex:
+    '''
+    Maps ids to their position in an array of ids. Compact, non-negative ids
+    are looked up in a dense array and any other ids through a sorted copy.
+    If an id is repeated the first position is used.
+    '''
+    def __init__(self, ids: numpy.ndarray):
+        self.ids = ids
+
+        n = len(ids)
+        positions = numpy.arange(n, dtype=numpy.int64)
+
+        self._dense = None
+        self._sorted_ids = None
+        self._order = None
+
+        if n == 0 or (ids.min() >= 0 and ids.max() < 2 * n):
+            self._dense = numpy.full(int(ids.max()) + 1 if n > 0 else 0, -1, dtype=numpy.int64)
+            self._dense[ids[::-1]] = positions[::-1]
+        else:
+            self._order = numpy.argsort(ids, kind='stable')
+            self._sorted_ids = ids[self._order]
+
+    def find(self, ids) -> numpy.ndarray:
+        '''
+        Returns the position of each id, or -1 for ids that are not in the array
+        '''
+        ids = numpy.asarray(ids, dtype=numpy.int64)
+
+        if self._dense is not None:
+            found = (ids >= 0) & (ids < len(self._dense))
+            positions = numpy.full(ids.shape, -1, dtype=numpy.int64)
+            positions[found] = self._dense[ids[found]]
+            return positions
+
+        # Empty id arrays always use the dense lookup, so there is at least one sorted id
+        i = numpy.minimum(numpy.searchsorted(self._sorted_ids, ids), len(self._sorted_ids) - 1)
+        return numpy.where(self._sorted_ids[i] == ids, self._order[i], -1)
+
+def _spread_bits(x: numpy.ndarray) -> numpy.ndarray:
+    '''
+    Moves the lowest 21 bits of each value to every third bit
+    '''
+    x = x.astype(numpy.uint64) & numpy.uint64(0x1fffff)
+    for shift, mask in (
+        (32, 0x1f00000000ffff),
+        (16, 0x1f0000ff0000ff),
+        (8, 0x100f00f00f00f00f),
+        (4, 0x10c30c30c30c30c3),
+        (2, 0x1249249249249249),
+    ):
+        x = (x | (x << numpy.uint64(shift))) & numpy.uint64(mask)
+    return x
+
+def morton_codes(points: numpy.ndarray, uniform: bool = False) -> numpy.ndarray:
+    '''
+    Returns the 63 bit Morton (Z-order) code of each point, quantized in the
+    bounding box of all points, or in the cube around it when uniform is true
+    so that codes follow distances along every axis alike
+    '''
+    if len(points) == 0:
+        return numpy.empty(0, dtype=numpy.uint64)
+
+    lo = points.min(axis=0)
+    extent = points.max(axis=0) - lo
+    if uniform:
+        extent[:] = extent.max()
+    extent[extent == 0.] = 1.
+
+    q = numpy.minimum((points - lo) / extent * 2097152., 2097151.).astype(numpy.uint64)
+
+    return \
+        (_spread_bits(q[:, 0]) << numpy.uint64(2)) | \
+        (_spread_bits(q[:, 1]) << numpy.uint64(1)) | \
+        _spread_bits(q[:, 2])
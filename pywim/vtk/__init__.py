@@ -220,7 +220,7 @@ def from_grid(dgrid):
 
     return grid
 
-def from_fea(mesh : pywim.fea.model.Mesh, inc : pywim.fea.result.Increment, outputs : List[str]):
+def _grid_from_objects(mesh : pywim.fea.model.Mesh):
     points = vtk.vtkPoints()
     points.SetNumberOfPoints(len(mesh.nodes))
     for n in mesh.nodes:
@@ -254,6 +254,90 @@ def from_fea(mesh : pywim.fea.model.Mesh, inc : pywim.fea.result.Increment, outp
             grid.InsertNextCell(e.GetCellType(), ids)
             nels += 1
 
+    return grid, nels
+
+# VTK cell type of each element type
+_VTK_CELL_TYPES = {
+    'HEXL8': 'VTK_HEXAHEDRON',
+    'VOXL': 'VTK_HEXAHEDRON',
+    'VOXLA': 'VTK_HEXAHEDRON',
+    'TETL4': 'VTK_TETRA',
+    'WEDL6': 'VTK_WEDGE',
+    'PSL4': 'VTK_QUAD',
+    'PSL3': 'VTK_TRIANGLE',
+    'PSQ6': 'VTK_QUADRATIC_TRIANGLE',
+}
+
+# VTK before 9 takes the cells of a grid as point counts followed by points
+_VTK_LEGACY_CELLS = VTK_MODULE_EXISTS and vtk.vtkVersion.GetVTKMajorVersion() < 9
+
+def grid_from_arrays(mesh : pywim.fea.model.ArrayMesh):
+    '''
+    Builds the grid of an ArrayMesh from its arrays. Point i is the node with
+    id i + 1, and the points share the coordinate array of the mesh when the
+    node ids are 1 to N in order.
+    '''
+    from vtk.util import numpy_support
+
+    ids = mesh.nodes.ids
+    coordinates = np.ascontiguousarray(mesh.nodes.coordinates)
+
+    if not np.array_equal(ids, np.arange(1, len(ids) + 1)):
+        coordinates = np.zeros((ids.max(initial=0), 3))
+        coordinates[ids - 1] = mesh.nodes.coordinates
+
+    points = vtk.vtkPoints()
+    points.SetData(numpy_support.numpy_to_vtk(coordinates, deep=False))
+
+    cell_types = []
+    cell_sizes = []
+    connectivity = []
+    for g in mesh.elements:
+        if g.type not in _VTK_CELL_TYPES:
+            raise Exception('Unsupported element type: %s' % g.type)
+
+        nodes = g.connectivity.nodes
+        cell_types.append(np.full(len(nodes), getattr(vtk, _VTK_CELL_TYPES[g.type]), dtype=np.uint8))
+        cell_sizes.append(np.full(len(nodes), nodes.shape[1], dtype=np.int64))
+        connectivity.append(nodes.reshape(-1) - 1)
+
+    cell_types = np.concatenate(cell_types + [np.empty(0, dtype=np.uint8)])
+    cell_sizes = np.concatenate(cell_sizes + [np.empty(0, dtype=np.int64)])
+    connectivity = np.concatenate(connectivity + [np.empty(0, dtype=np.int64)])
+
+    # The cell arrays are temporaries, so VTK gets its own copy of them
+    id_type = numpy_support.get_numpy_array_type(vtk.VTK_ID_TYPE)
+
+    def id_array(a):
+        return numpy_support.numpy_to_vtkIdTypeArray(a.astype(id_type), deep=True)
+
+    types = numpy_support.numpy_to_vtk(cell_types, deep=True, array_type=vtk.VTK_UNSIGNED_CHAR)
+
+    offsets = np.concatenate(([0], np.cumsum(cell_sizes)))
+
+    cell_array = vtk.vtkCellArray()
+    grid = vtk.vtkUnstructuredGrid()
+    grid.SetPoints(points)
+
+    if _VTK_LEGACY_CELLS:
+        # The location of a cell is where its point count is
+        legacy = np.insert(connectivity, offsets[:-1], cell_sizes)
+        cell_array.SetCells(len(cell_types), id_array(legacy))
+        grid.SetCells(types, id_array(offsets[:-1] + np.arange(len(cell_types))), cell_array)
+    else:
+        # The offsets of the cells into one connectivity array
+        cell_array.SetData(id_array(offsets), id_array(connectivity))
+        grid.SetCells(types, cell_array)
+
+    return grid
+
+def from_fea(mesh : pywim.fea.model.Mesh, inc : pywim.fea.result.Increment, outputs : List[str]):
+    if isinstance(mesh, pywim.fea.model.ArrayMesh):
+        grid = grid_from_arrays(mesh)
+        nels = grid.GetNumberOfCells()
+    else:
+        grid, nels = _grid_from_objects(mesh)
+
     celldata = grid.GetCellData()
     pointdata = grid.GetPointData()
 
@@ -0,0 +1,201 @@
+import json
+import unittest
+import numpy
+
+from pywim import WimException
+from pywim.fea import model
+
+class ArrayMeshTest(unittest.TestCase):
+    def setUp(self):
+        self.model = model.Model('cube')
+
+        for i in range(8):
+            self.model.mesh.nodes.append(model.Node(i + 1, float(i % 2), float((i // 2) % 2), float(i // 4)))
+
+        hexes = model.ElementGroup('HEXL8')
+        hexes.connectivity.append(model.Element(1, [1, 2, 4, 3, 5, 6, 8, 7]))
+        self.model.mesh.elements.append(hexes)
+
+        quads = model.ElementGroup('PSL4', 0.5)
+        quads.connectivity.append(model.Element(2, [1, 2, 4, 3]))
+        quads.connectivity.append(model.Element(3, [5, 6, 8, 7]))
+        self.model.mesh.elements.append(quads)
+
+    def test_same_json(self):
+        d = self.model.mesh.to_dict()
+        mesh = model.ArrayMesh.FromMesh(self.model.mesh)
+
+        self.assertEqual(json.dumps(mesh.to_dict()), json.dumps(d))
+        self.assertEqual(mesh.elements[1].connectivity.nodes.shape, (2, 4))
+
+        self.model.mesh = mesh
+        self.assertEqual(model.Model.from_dict(self.model.to_dict()).mesh.to_dict(), d)
+
+    def test_from_dict(self):
+        d = self.model.mesh.to_dict()
+        mesh = model.ArrayMesh.from_dict(d)
+
+        self.assertIsInstance(mesh.nodes, model.NodeArray)
+        self.assertIsInstance(mesh.elements[0].connectivity, model.ElementArray)
+        self.assertEqual(mesh.elements[1].thickness, 0.5)
+        self.assertEqual(mesh.nodes.ids.tolist(), list(range(1, 9)))
+        self.assertEqual(json.dumps(mesh.to_dict()), json.dumps(d))
+
+        self.assertIsNone(model.ArrayMesh().to_dict())
+
+    def test_views(self):
+        ids = numpy.arange(1, 9)
+        coordinates = numpy.array([n.__to_dict__()[1:] for n in self.model.mesh.nodes])
+        nodes = numpy.array([[1, 2, 4, 3, 5, 6, 8, 7]])
+
+        mesh = model.ArrayMesh(ids, coordinates)
+        group = mesh.add_group('HEXL8', [1], nodes)
+
+        self.assertIs(mesh.nodes.coordinates, coordinates)
+        self.assertIs(group.connectivity.nodes, nodes)
+
+        self.assertEqual([n.id for n in mesh.nodes], list(range(1, 9)))
+        self.assertEqual(group.connectivity[0].nodes, nodes[0].tolist())
+        self.assertEqual(mesh.nodes[7].__to_dict__(), self.model.mesh.nodes[7].__to_dict__())
+
+        with self.assertRaises(ValueError):
+            model.NodeArray([1, 2], coordinates)
+
+class MeshIndexTest(unittest.TestCase):
+    def setUp(self):
+        self.mesh = model.Mesh()
+
+        for i, nid in enumerate([10, 20, 30, 40, 1000]):
+            self.mesh.nodes.append(model.Node(nid, float(i), 0., 0.))
+
+        tris = model.ElementGroup('PST3')
+        tris.connectivity.append(model.Element(7, [10, 20, 30]))
+        tris.connectivity.append(model.Element(3, [20, 30, 40]))
+        self.mesh.elements.append(tris)
+
+        quads = model.ElementGroup('PSL4')
+        quads.connectivity.append(model.Element(500, [10, 20, 40, 1000]))
+        self.mesh.elements.append(quads)
+
+    def check(self, mesh):
+        self.assertEqual(mesh.nodes_of(model.NodeSet('n', [1000, 10])).tolist(), [1000, 10])
+        self.assertEqual(mesh.nodes_of(model.ElementSet('e', [3, 500])).tolist(), [10, 20, 30, 40, 1000])
+        self.assertEqual(mesh.coordinates_of([40, 1000])[:, 0].tolist(), [3., 4.])
+
+        found = mesh.elements_of(model.ElementSet('e', [500, 3, 7]))
+        self.assertEqual([g.type for g, _, _ in found], ['PST3', 'PSL4'])
+        self.assertEqual(found[0][1].tolist(), [3, 7])
+        self.assertEqual(found[0][2].tolist(), [[20, 30, 40], [10, 20, 30]])
+        self.assertEqual(found[1][2].tolist(), [[10, 20, 40, 1000]])
+
+        with self.assertRaises(WimException):
+            mesh.nodes_of([10, 11])
+
+        with self.assertRaises(WimException):
+            mesh.elements_of([4])
+
+    def test_object_mesh(self):
+        self.check(self.mesh)
+
+        self.mesh.nodes.append(model.Node(11, 0., 1., 0.))
+        self.assertEqual(self.mesh.coordinates_of([11]).tolist(), [[0., 1., 0.]])
+
+        self.assertIsNone(model.Mesh().to_dict())
+        self.assertEqual(model.Mesh().index().element_ids.tolist(), [])
+
+    def test_array_mesh(self):
+        mesh = model.ArrayMesh.FromMesh(self.mesh)
+        self.check(mesh)
+
+        index = mesh.index()
+        self.assertIs(index.nodes, mesh.nodes)
+        self.assertIs(mesh.index(), index)
+
+        mesh.add_group('PST3', [8], [[30, 40, 1000]])
+        self.assertEqual(mesh.elements_of([8])[0][0].type, 'PST3')
+
+        mesh.nodes.ids[4] = 50
+        self.assertEqual(mesh.coordinates_of([50]).tolist(), [[4., 0., 0.]])
+
+    def test_changed_in_place(self):
+        self.mesh.index()
+        self.mesh.nodes[4].id = 50
+
+        self.assertIsNot(self.mesh.index(rebuild=True), self.mesh.index(rebuild=True))
+        self.assertEqual(self.mesh.coordinates_of([50]).tolist(), [[4., 0., 0.]])
+
+class RenumberTest(unittest.TestCase):
+    def setUp(self):
+        # A 20 x 2 strip of quads with shuffled node ids
+        rng = numpy.random.RandomState(3)
+        nx = 21
+        grid = numpy.arange(3 * nx).reshape(3, nx)
+        ids = rng.permutation(3 * nx) * 7 + 5
+
+        self.model = model.Model('strip')
+        for i, nid in enumerate(ids.tolist()):
+            self.model.mesh.nodes.append(model.Node(nid, float(i % nx), float(i // nx)))
+
+        quads = model.ElementGroup('PSL4')
+        corners = numpy.stack([grid[:-1, :-1], grid[:-1, 1:], grid[1:, 1:], grid[1:, :-1]], axis=-1).reshape(-1, 4)
+        for e, c in zip(rng.permutation(len(corners)).tolist(), corners):
+            quads.connectivity.append(model.Element(e + 100, ids[c].tolist()))
+        self.model.mesh.elements.append(quads)
+
+        self.left = model.NodeSet('left', ids[grid[:, 0]].tolist())
+        self.model.regions.node_sets.append(self.left)
+        self.model.regions.element_sets.append(model.ElementSet('first', [100, 101]))
+        self.model.regions.surface_sets.append(model.SurfaceSet('s', [model.ElementFaces(2, [102])]))
+        self.model.constraints.equations.append(model.ConstraintEquation([[int(ids[0]), 1, 1.], [int(ids[1]), 1, -1.]]))
+
+    def bandwidth(self, mesh):
+        positions = mesh._node_positions([n for e in mesh.elements[0].connectivity for n in e.nodes]).reshape(-1, 4)
+        return (positions.max(axis=1) - positions.min(axis=1)).max()
+
+    def check(self, method):
+        def sorted_rows(a):
+            return a[numpy.lexsort(a.T[::-1])]
+
+        mesh = self.model.mesh
+        before = self.bandwidth(mesh)
+        left = mesh.coordinates_of(self.left)
+        first = sorted_rows(mesh.coordinates_of(model.ElementSet('e', [100, 101])))
+        face = sorted_rows(mesh.coordinates_of(model.ElementSet('e', [102])))
+        terms = [t[0] for t in self.model.constraints.equations[0].terms]
+
+        node_ids, element_ids = self.model.renumber(method)
+        mesh = self.model.mesh
+
+        self.assertEqual(sorted(mesh.index().nodes.ids.tolist()), list(range(1, 64)))
+        self.assertEqual(sorted(mesh.index().element_ids.tolist()), list(range(1, 41)))
+        self.assertLess(self.bandwidth(mesh), before)
+
+        surface = model.ElementSet('e', self.model.regions.surface_sets[0].faces[0].elements)
+        numpy.testing.assert_array_equal(mesh.coordinates_of(self.left), left)
+        numpy.testing.assert_array_equal(sorted_rows(mesh.coordinates_of(self.model.regions.element_sets[0])), first)
+        numpy.testing.assert_array_equal(sorted_rows(mesh.coordinates_of(surface)), face)
+
+        renumbered = [t[0] for t in self.model.constraints.equations[0].terms]
+        self.assertEqual(node_ids[numpy.array(renumbered) - 1].tolist(), terms)
+        self.assertEqual(element_ids[numpy.array(self.model.regions.element_sets[0].elements) - 1].tolist(), [100, 101])
+
+    def test_rcm(self):
+        self.check('rcm')
+
+    def test_morton(self):
+        self.model.mesh = model.ArrayMesh.FromMesh(self.model.mesh)
+        self.check('morton')
+        self.assertIsInstance(self.model.mesh.nodes, model.NodeArray)
+
+    def test_unknown(self):
+        with self.assertRaises(ValueError):
+            self.model.renumber('random')
+
+    def test_missing_id(self):
+        self.model.regions.surface_sets.append(model.SurfaceSet('missing', [model.ElementFaces(1, [99])]))
+        before = json.dumps(self.model.to_dict(), sort_keys=True)
+
+        with self.assertRaises(WimException):
+            self.model.renumber()
+
+        self.assertEqual(json.dumps(self.model.to_dict(), sort_keys=True), before)
@@ -0,0 +1,33 @@
+import unittest
+from pywim import geom
+from pywim.geom import benchmark
+
+class Shapes(unittest.TestCase):
+    def test_valid(self):
+        for name, shape in benchmark.SHAPES.items():
+            positions, triangles = shape(2000)
+            check = geom.tri.Mesh.FromArrays(positions, triangles).check()
+
+            self.assertTrue(check.valid, name)
+            self.assertGreater(check.volume, 0., name)
+            self.assertAlmostEqual(len(triangles) / 2000., 1., delta=0.2, msg=name)
+
+    def test_box(self):
+        positions, triangles = benchmark.box(1200)
+        check = geom.tri.Mesh.FromArrays(positions, triangles).check()
+
+        self.assertEqual(len(triangles), 1200)
+        self.assertAlmostEqual(check.volume, 100. * 60. * 20.)
+
+class Benchmark(unittest.TestCase):
+    def test_operations(self):
+        results = benchmark.benchmark('cylinder', 1000, trace_memory=False)
+        operations = [r.operation for r in results]
+
+        self.assertEqual(operations[:2], ['FromSTL', 'analyze_mesh'])
+        self.assertIn('select_planar_face', operations)
+        self.assertIn('face_from_ids', operations)
+
+        for r in results:
+            self.assertEqual(r.triangles, 1024)
+            self.assertGreater(r.throughput, 0.)
@@ -0,0 +1,86 @@
+import os
+import tempfile
+import unittest
+import numpy
+from pywim import geom
+
+from . import stl_loader
+
+class MeshCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.cache = geom.cache.MeshCache(self.tmp.name)
+        self.stl_mesh = stl_loader.load_from_file('shelf_bracket.stl')
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_reopen(self):
+        mesh = self.cache.from_stl(self.stl_mesh)
+        cached = self.cache.from_stl(self.stl_mesh)
+
+        self.assertIsInstance(cached.positions, numpy.memmap)
+        self.assertEqual(len(self.cache.entries()), 1)
+
+        numpy.testing.assert_array_equal(cached.triangle_vertices, mesh.triangle_vertices)
+        numpy.testing.assert_array_equal(cached.topology.pair_triangles, mesh.topology.pair_triangles)
+        numpy.testing.assert_array_equal(cached.half_edges.twin, mesh.half_edges.twin)
+
+        for t in (0, 100, 200):
+            self.assertEqual(
+                sorted(tri.id for tri in cached.select_planar_face(t).triangles),
+                sorted(tri.id for tri in mesh.select_planar_face(t).triangles)
+            )
+
+    def test_analyze_args(self):
+        self.cache.from_stl(self.stl_mesh)
+        self.cache.from_stl(self.stl_mesh, half_edges=True)
+
+        self.assertEqual(len(self.cache.entries()), 2)
+
+    def test_evict(self):
+        points = self.stl_mesh.points
+
+        self.cache.from_points(points)
+        first = self.cache.key(points)
+        os.utime(os.path.join(self.tmp.name, first, 'mesh.json'), (0, 0))
+
+        self.cache.max_size = self.cache.size()
+        self.cache.from_points(points[:100])
+
+        self.assertNotIn(first, self.cache.entries())
+        self.assertEqual(len(self.cache.entries()), 1)
+
+    def test_evicted_while_loading(self):
+        points = self.stl_mesh.points
+        self.cache.from_points(points)
+
+        # As if another process evicted the entry after the meta file was read
+        key = self.cache.key(points)
+        entry = os.path.join(self.tmp.name, key)
+        for name in os.listdir(entry):
+            if name.endswith('.npy'):
+                os.remove(os.path.join(entry, name))
+
+        self.assertIsNone(self.cache.load(key))
+
+    def test_entries_order(self):
+        points = self.stl_mesh.points
+        keys = []
+
+        for n, used in ((300, 30), (100, 10), (200, 20)):
+            self.cache.from_points(points[:n])
+            keys.append(self.cache.key(points[:n]))
+            os.utime(os.path.join(self.tmp.name, keys[-1], 'mesh.json'), (used, used))
+
+        self.assertEqual(list(self.cache.entries()), [keys[1], keys[2], keys[0]])
+
+    def test_numpy_arguments(self):
+        points = self.stl_mesh.points
+
+        self.assertEqual(
+            self.cache.key(points, min_triangle_area=numpy.float32(0.5), remove_duplicate_triangles=numpy.bool_(True)),
+            self.cache.key(points, min_triangle_area=0.5, remove_duplicate_triangles=True)
+        )
+
+        self.cache.from_points(points, min_triangle_area=numpy.float64(1e-6))
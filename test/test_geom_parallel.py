@@ -0,0 +1,77 @@
+import multiprocessing
+import os
+import subprocess
+import sys
+import unittest
+import numpy
+from unittest import mock
+from pywim import geom
+from pywim.geom import parallel
+
+from . import stl_loader
+
+class AnalyzeMeshes(unittest.TestCase):
+    def setUp(self):
+        self.meshes = [
+            stl_loader.load_from_file('cube.stl'),
+            stl_loader.load_from_file('shelf_bracket.stl'),
+            geom.tri.Mesh.FromArrays(
+                [[0., 0., 0.], [1., 0., 0.], [0., 1., 0.], [1., 1., 0.], [1., 0., 0.]],
+                [[0, 1, 2], [3, 2, 4]],
+                vertex_ids=[10, 11, 12, 13, 14],
+                triangle_ids=[5, 7],
+                analyze_mesh=False
+            ),
+        ]
+
+    def test_process_pool(self):
+        sequential = parallel.analyze_meshes(self.meshes, processes=1)
+        pooled = parallel.analyze_meshes(self.meshes, processes=2)
+
+        self.assertEqual(len(pooled), 3)
+
+        for a, b in zip(sequential, pooled):
+            arrays = b.analysis_arrays()
+            for name, array in a.analysis_arrays().items():
+                numpy.testing.assert_array_equal(array, arrays[name])
+
+    def test_ids(self):
+        mesh = parallel.analyze_meshes(self.meshes, processes=2)[2]
+
+        self.assertEqual(mesh.vertex_ids.tolist(), [10, 11, 12, 13])
+        self.assertEqual(mesh.triangle_ids.tolist(), [5, 7])
+        self.assertEqual(mesh.topology.pair_count, 1)
+
+    def test_import_without_shared_memory(self):
+        code = (
+            'import sys; sys.modules["multiprocessing.shared_memory"] = None; '
+            'import pywim; from pywim.geom import parallel; assert parallel.shared_memory is None'
+        )
+        subprocess.check_call([sys.executable, '-c', code])
+
+    def test_serial_fallback(self):
+        with mock.patch.object(parallel, 'shared_memory', None):
+            meshes = parallel.analyze_meshes(self.meshes, processes=2)
+
+        self.assertEqual(len(meshes), 3)
+        self.assertEqual(meshes[2].triangle_ids.tolist(), [5, 7])
+
+    @unittest.skipUnless(
+        parallel.shared_memory is not None and os.path.isdir('/dev/shm') and multiprocessing.get_start_method() == 'fork',
+        'needs forked processes and POSIX shared memory'
+    )
+    def test_failure_releases_blocks(self):
+        analyze = parallel._analyze_arrays
+
+        def fail_small(arrays, strict, analyze_args):
+            if len(arrays['triangle_vertices']) == 2:
+                raise ValueError('small mesh')
+            return analyze(arrays, strict, analyze_args)
+
+        before = set(os.listdir('/dev/shm'))
+
+        with mock.patch.object(parallel, '_analyze_arrays', fail_small):
+            with self.assertRaises(ValueError):
+                parallel.analyze_meshes(self.meshes[::-1] + self.meshes, processes=2)
+
+        self.assertEqual(set(os.listdir('/dev/shm')) - before, set())
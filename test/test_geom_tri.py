@@ -1,3 +1,5 @@
+import os
+import tempfile
 import unittest
 import math
 import numpy
@@ -84,3 +86,706 @@ class IllFormedSTL(unittest.TestCase):
         mesh.analyze_mesh(remove_degenerate_triangles=False)
 
         self.assertEqual(len(mesh.triangles), 284)
+
+    def test_remove_slivers_and_duplicates(self):
+        positions = [(0., 0., 0.), (1., 0., 0.), (0., 1., 0.), (2., 0., 0.), (1., 1., 0.)]
+        triangles = [(0, 1, 2), (2, 1, 0), (0, 1, 3), (1, 4, 2), (1, 1, 4), (1, 2, 4)]
+
+        mesh = geom.tri.Mesh.FromArrays(positions, triangles, triangle_ids=[10, 11, 12, 13, 14, 15], analyze_mesh=False)
+        mesh.analyze_mesh(renumber_triangles=False, min_triangle_area=1e-12, remove_duplicate_triangles=True)
+
+        self.assertEqual(mesh.triangle_ids.tolist(), [10, 13])
+        self.assertEqual(mesh.triangle_indices([13, 11]).tolist(), [1, -1])
+        numpy.testing.assert_allclose(mesh.areas, [0.5, 0.5])
+        self.assertEqual(mesh.topology.pair_count, 1)
+
+        mesh = geom.tri.Mesh.FromArrays(positions, triangles, analyze_mesh=False)
+        mesh.analyze_mesh()
+
+        self.assertEqual(mesh.triangle_ids.tolist(), [0, 1, 2, 3, 4])
+        self.assertEqual(mesh.triangle_vertices[4].tolist(), [1, 2, 4])
+
+class ArrayMesh(unittest.TestCase):
+    def setUp(self):
+        positions = [
+            (0., 0., 0.),
+            (1., 0., 0.),
+            (1., 1., 0.),
+            (0., 1., 0.)
+        ]
+
+        self.mesh = geom.tri.Mesh.FromArrays(positions, [(0, 1, 2), (0, 2, 3)])
+
+    def test_geometry(self):
+        self.assertEqual(self.mesh.positions.shape, (4, 3))
+        self.assertEqual(self.mesh.triangle_vertices.shape, (2, 3))
+
+        numpy.testing.assert_allclose(self.mesh.normals, [(0., 0., 1.), (0., 0., 1.)])
+        numpy.testing.assert_allclose(self.mesh.areas, [0.5, 0.5])
+
+    def test_views(self):
+        self.assertEqual(len(self.mesh.vertices), 4)
+        self.assertEqual(len(self.mesh.triangles), 2)
+
+        t = self.mesh.triangles[1]
+
+        self.assertEqual(t.id, 1)
+        self.assertEqual([v.id for v in t.points], [0, 2, 3])
+        self.assertAlmostEqual(t.normal.t, 1.)
+        self.assertAlmostEqual(t.area, 0.5)
+
+    def test_add_entities(self):
+        mesh = geom.tri.Mesh()
+
+        v1 = mesh.add_vertex(10, 0., 0., 0.)
+        v2 = mesh.add_vertex(11, 1., 0., 0.)
+        v3 = mesh.add_vertex(12, 0., 1., 0.)
+
+        mesh.add_triangle(5, v1, v2, v3)
+
+        self.assertEqual(mesh.vertex_ids.tolist(), [10, 11, 12])
+        self.assertEqual(mesh.triangle_vertices.tolist(), [[0, 1, 2]])
+        self.assertEqual(mesh.triangles[0].id, 5)
+
+class PointsMesh(unittest.TestCase):
+    def test_from_points(self):
+        stl_mesh = stl_loader.load_from_file('cube.stl')
+
+        mesh = geom.tri.Mesh.FromPoints(stl_mesh.points, False)
+
+        self.assertEqual(mesh.positions.shape, (36, 3))
+        self.assertEqual(mesh.triangle_vertices[4].tolist(), [12, 13, 14])
+        numpy.testing.assert_allclose(mesh.positions[12:15].flatten(), stl_mesh.points[4])
+
+class CombineVertices(unittest.TestCase):
+    def _mesh(self, offset):
+        points = [
+            (0., 0., 0., 1., 0., 0., 0., 1., 0.),
+            (1., 0., 0., 1., 1., offset, 0., 1., 0.),
+            (-0., 1., 0., 1., 1., 0., 0., 2., 0.)
+        ]
+
+        return geom.tri.Mesh.FromPoints(points, False)
+
+    def test_exact(self):
+        mesh = self._mesh(1.e-4)
+        mesh.analyze_mesh()
+
+        self.assertEqual(len(mesh.vertices), 6)
+        self.assertEqual(mesh.vertex_ids.tolist(), [0, 1, 2, 4, 7, 8])
+        self.assertEqual(mesh.triangle_vertices.tolist(), [[0, 1, 2], [1, 3, 2], [2, 4, 5]])
+
+    def test_tolerance(self):
+        mesh = self._mesh(1.e-4)
+        mesh.analyze_mesh(renumber_vertices=True, vertex_tolerance=1.e-3)
+
+        self.assertEqual(len(mesh.vertices), 5)
+        self.assertEqual(mesh.vertex_ids.tolist(), [0, 1, 2, 3, 4])
+        self.assertEqual(mesh.triangle_vertices.tolist(), [[0, 1, 2], [1, 3, 2], [2, 3, 4]])
+
+class ReadSTL(unittest.TestCase):
+    def _path(self, name):
+        return os.path.join(os.path.dirname(stl_loader.__file__), name)
+
+    def test_binary(self):
+        points = geom.tri.read_stl(self._path('shelf_bracket.stl'))
+
+        self.assertIsInstance(points, numpy.memmap)
+        numpy.testing.assert_array_equal(points, stl_loader.load_from_file('shelf_bracket.stl').points)
+
+    def test_ascii(self):
+        path = self._path('cube.stl')
+        points = geom.tri.read_stl(path)
+
+        numpy.testing.assert_array_equal(points, stl_loader.load_from_file('cube.stl').points)
+
+        # Facets split over many chunks
+        with open(path, 'rb') as f:
+            numpy.testing.assert_array_equal(geom.tri._read_ascii_stl(f, chunk_size=50), points)
+
+    def test_from_path(self):
+        mesh = geom.tri.Mesh.FromSTL(self._path('shelf_bracket.stl'))
+        expected = geom.tri.Mesh.FromSTL(stl_loader.load_from_file('shelf_bracket.stl'))
+
+        numpy.testing.assert_array_equal(mesh.positions, expected.positions)
+        numpy.testing.assert_array_equal(mesh.triangle_vertices, expected.triangle_vertices)
+
+    def test_is_path(self):
+        class PathLike:
+            def __fspath__(self):
+                return 'cube.stl'
+
+        self.assertTrue(geom.tri._is_path('cube.stl'))
+        self.assertTrue(geom.tri._is_path(b'cube.stl'))
+        self.assertTrue(geom.tri._is_path(PathLike()))
+        self.assertFalse(geom.tri._is_path(stl_loader.load_from_file('cube.stl')))
+
+    def test_invalid(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'bad.stl')
+
+            with open(path, 'wb') as f:
+                f.write(b'not an stl')
+
+            with self.assertRaises(ValueError):
+                geom.tri.read_stl(path)
+
+class CubeTopology(unittest.TestCase):
+    def setUp(self):
+        stl_mesh = stl_loader.load_from_file('cube.stl')
+        self.mesh = geom.tri.Mesh.FromSTL(stl_mesh, True)
+        self.topo = self.mesh.topology
+
+    def test_counts(self):
+        self.assertEqual(self.topo.edge_count, 18)
+        self.assertEqual(self.topo.pair_count, 18)
+        self.assertEqual(len(self.mesh.edges), 18)
+
+        self.assertTrue(numpy.all(numpy.diff(self.topo.edge_triangles_ptr) == 2))
+        self.assertTrue(numpy.all(numpy.diff(self.topo.triangle_pairs_ptr) == 3))
+
+    def test_angles(self):
+        self.assertEqual(numpy.isclose(self.topo.pair_angle, 0.).sum(), 6)
+
+        # The bottom face of cube.stl is flipped, so its edges look concave
+        numpy.testing.assert_allclose(
+            numpy.sort(self.topo.pair_face_angle),
+            [0.5 * math.pi] * 4 + [math.pi] * 6 + [1.5 * math.pi] * 8
+        )
+
+    def test_label_faces(self):
+        labels = self.mesh.label_faces(self.topo.pair_angle < 0.1)
+
+        self.assertEqual(len(numpy.unique(labels)), 6)
+        self.assertEqual(labels[[0, 1, 10, 11]].tolist(), [0, 0, 10, 10])
+
+    def test_neighbors(self):
+        for t in range(12):
+            start, end = self.topo.triangle_pairs_ptr[t:t + 2]
+            for pair, other in zip(self.topo.triangle_pairs[start:end], self.topo.triangle_neighbors[start:end]):
+                self.assertEqual(set(self.topo.pair_triangles[pair]), {t, other})
+
+class MergeTreeFaces(unittest.TestCase):
+    def setUp(self):
+        stl_mesh = stl_loader.load_from_file('shelf_bracket.stl')
+        self.mesh = geom.tri.Mesh.FromSTL(stl_mesh, True)
+
+    def test_matches_labels(self):
+        topo = self.mesh.topology
+        for max_angle in (0., 0.1, 0.5, 1.6, 3.2):
+            labels = self.mesh.label_faces(topo.pair_angle < max_angle)
+            for t in (0, 17, len(self.mesh.triangles) - 1):
+                face = self.mesh.merge_tree.face(t, max_angle)
+                self.assertEqual(sorted(face.tolist()), numpy.flatnonzero(labels == labels[t]).tolist())
+
+    def test_built_for_many_angles(self):
+        angles = numpy.linspace(0.1, 1., geom.tri.Mesh._MERGE_TREE_MIN_ANGLES + 1)
+        ids = self.mesh.triangle_ids[17]
+
+        faces = [sorted(t.id for t in self.mesh.select_face_by_edge_angle(ids, a).triangles) for a in angles[:-1]]
+        self.assertIsNone(self.mesh._merge_tree)
+
+        faces.append(sorted(t.id for t in self.mesh.select_face_by_edge_angle(ids, angles[-1]).triangles))
+        self.assertIsNotNone(self.mesh._merge_tree)
+
+        for a, face in zip(angles, faces):
+            self.assertEqual(sorted(t.id for t in self.mesh.select_face_by_edge_angle(ids, a).triangles), face)
+
+    def test_invalidated(self):
+        tree = self.mesh.merge_tree
+        self.mesh.analyze_mesh()
+        self.assertIsNot(self.mesh.merge_tree, tree)
+
+def _cylinder_arrays(n=24, h=10., r=5.):
+    # Tube of n facets around the z axis, closed by fans at both ends
+    a = numpy.linspace(0., 2. * math.pi, n, endpoint=False)
+    ring = numpy.stack([r * numpy.cos(a), r * numpy.sin(a), numpy.zeros(n)], axis=1)
+    positions = numpy.concatenate([ring, ring + [0., 0., h], [[0., 0., 0.], [0., 0., h]]])
+
+    i = numpy.arange(n)
+    j = (i + 1) % n
+    triangles = numpy.concatenate([
+        numpy.stack([i, j, j + n], axis=1),
+        numpy.stack([i, j + n, i + n], axis=1),
+        numpy.stack([numpy.full(n, 2 * n), j, i], axis=1),
+        numpy.stack([numpy.full(n, 2 * n + 1), i + n, j + n], axis=1),
+    ])
+
+    return positions, triangles
+
+def _box_arrays(n=8, size=1.):
+    '''
+    Positions and triangle vertices of a cube with every side split into n by n squares
+    '''
+    g = numpy.linspace(0., size, n + 1)
+    u, v = [a.reshape(-1) for a in numpy.meshgrid(g, g, indexing='ij')]
+    c = (numpy.arange(n)[:, None] * (n + 1) + numpy.arange(n)).reshape(-1)
+    quads = numpy.concatenate((
+        numpy.column_stack((c, c + n + 1, c + 1)),
+        numpy.column_stack((c + 1, c + n + 1, c + n + 2)),
+    ))
+    positions = []
+    triangles = []
+    zero = numpy.zeros_like(u)
+    full = numpy.full_like(u, size)
+    for side in (
+        (v, u, zero), (u, v, full),
+        (u, zero, v), (v, full, u),
+        (zero, v, u), (full, u, v),
+    ):
+        triangles.append(quads + len(positions) * len(u))
+        positions.append(numpy.column_stack(side))
+    return numpy.concatenate(positions), numpy.concatenate(triangles)
+
+class Segment(unittest.TestCase):
+    def test_cube(self):
+        stl_mesh = stl_loader.load_from_file('cube.stl')
+        mesh = geom.tri.Mesh.FromSTL(stl_mesh, True)
+
+        segmentation = mesh.segment()
+
+        self.assertEqual(segmentation.face_count, 6)
+        self.assertTrue(numpy.all(segmentation.kind == geom.tri.FaceKind.planar.value))
+        self.assertIs(mesh.segment(), segmentation)
+
+        for t in range(12):
+            self.assertEqual(
+                sorted(tri.id for tri in mesh.select_segment_face(t).triangles),
+                sorted(tri.id for tri in mesh.select_planar_face(t).triangles)
+            )
+
+    def test_cylinder(self):
+        mesh = geom.tri.Mesh.FromArrays(*_cylinder_arrays())
+
+        segmentation = mesh.segment()
+
+        kinds = [segmentation.face_kind(f) for f in range(segmentation.face_count)]
+        self.assertEqual(kinds.count(geom.tri.FaceKind.planar), 2)
+        self.assertEqual(kinds.count(geom.tri.FaceKind.cylindrical), 1)
+
+        cylinder = kinds.index(geom.tri.FaceKind.cylindrical)
+        self.assertEqual(sorted(segmentation.triangles_of(cylinder).tolist()), list(range(48)))
+        self.assertAlmostEqual(abs(segmentation.axis[cylinder][2]), 1.)
+        numpy.testing.assert_allclose(segmentation.center[cylinder], [0., 0., 5.], atol=1e-9)
+        self.assertAlmostEqual(segmentation.radius[cylinder], 5., places=6)
+
+    def test_empty(self):
+        mesh = geom.tri.Mesh.FromArrays(numpy.empty((0, 3)), numpy.empty((0, 3), dtype=numpy.int64))
+
+        segmentation = mesh.segment()
+
+        self.assertEqual(segmentation.face_count, 0)
+        self.assertEqual(segmentation.axis.shape, (0, 3))
+        self.assertEqual(segmentation.center.shape, (0, 3))
+
+class CylinderSelection(unittest.TestCase):
+    def setUp(self):
+        self.mesh = geom.tri.Mesh.FromArrays(*_cylinder_arrays())
+
+    def test_try_select(self):
+        face = self.mesh.try_select_cylinder_face(5)
+
+        self.assertEqual(sorted(t.id for t in face.triangles), list(range(48)))
+        self.assertIsNone(self.mesh.try_select_cylinder_face(60))
+
+    def test_select_cylinders(self):
+        cylinders = self.mesh.select_cylinders([0, 30, 60, 80])
+
+        self.assertIsNone(cylinders[2])
+        self.assertIsNone(cylinders[3])
+
+        for face, cylinder in cylinders[:2]:
+            self.assertEqual(len(face.triangles), 48)
+            self.assertAlmostEqual(cylinder.radius, 5., places=6)
+            self.assertAlmostEqual(abs(cylinder.vector.t), 1.)
+            self.assertAlmostEqual(cylinder.center.x, 0.)
+            self.assertAlmostEqual(cylinder.center.y, 0.)
+
+    def test_grow_regions(self):
+        topo = self.mesh.topology
+        normals = self.mesh.normals
+
+        def grow(**kwargs):
+            region, node = geom.tri._grow_regions(
+                topo.triangle_pairs_ptr,
+                topo.triangle_neighbors,
+                numpy.array([0, 30, 60]),
+                lambda r, t: numpy.abs(normals[t, 2]) < 0.5,
+                **kwargs
+            )
+            return sorted(zip(region.tolist(), node.tolist()))
+
+        expected = grow()
+        self.assertEqual(len(expected), 48 + 48 + 49)
+
+        self.assertEqual(grow(max_levels=1), expected)
+        self.assertEqual(grow(max_levels=0, max_visited=1), expected)
+
+class FaceGeometry(unittest.TestCase):
+    def setUp(self):
+        self.mesh = geom.tri.Mesh.FromArrays(*_cylinder_arrays())
+        self.tube = self.mesh.face_from_ids(range(48))
+        self.top = self.mesh.face_from_ids(range(95, 71, -1))
+
+    def test_indices(self):
+        self.assertIs(self.top.mesh, self.mesh)
+        self.assertEqual(self.top.indices.tolist(), list(range(72, 96)))
+        self.assertEqual(sorted(t.id for t in self.top.triangles), list(range(72, 96)))
+
+    def test_changed_after_selection(self):
+        face = self.mesh.select_planar_face(72)
+        top_area = face.area()
+
+        face.triangles.update(self.tube.triangles)
+
+        self.assertIsNone(face.indices)
+        self.assertAlmostEqual(face.area(), top_area + self.tube.area())
+        self.assertLess(face.center().point[2], self.top.center().point[2])
+
+        face.triangles -= self.tube.triangles
+        self.assertAlmostEqual(face.area(), top_area)
+        numpy.testing.assert_allclose(face.center().point, self.top.center().point, atol=1e-12)
+
+    def test_rotation_axis(self):
+        for face in (self.tube, geom.tri.Face(self.tube.triangles)):
+            axis = face.rotation_axis()
+
+            numpy.testing.assert_allclose([axis.r, axis.s, axis.t], [0., 0., 1.], atol=1e-12)
+            numpy.testing.assert_allclose(axis.origin.point, [0., 0., 5.], atol=1e-12)
+            self.assertIsNone(face.mean_normal())
+
+        self.assertIsNone(self.top.rotation_axis())
+
+    def test_planar(self):
+        for face in (self.top, geom.tri.Face(self.top.triangles)):
+            axis = face.planar_axis()
+            normal = face.mean_normal()
+
+            numpy.testing.assert_allclose([axis.r, axis.s, axis.t], [0., 0., 1.], atol=1e-12)
+            numpy.testing.assert_allclose([normal.r, normal.s, normal.t], [0., 0., 1.], atol=1e-12)
+            numpy.testing.assert_allclose(face.center().point, [0., 0., 10.], atol=1e-12)
+            numpy.testing.assert_allclose(face.centroid().point, [0., 0., 10.], atol=1e-12)
+            self.assertAlmostEqual(face.area(), 12 * 25. * math.sin(math.pi / 12.))
+
+            lower, upper = face.bounding_box()
+            numpy.testing.assert_allclose(lower.point, [-5., -5., 10.], atol=1e-12)
+            numpy.testing.assert_allclose(upper.point, [5., 5., 10.], atol=1e-12)
+
+    def test_empty(self):
+        face = geom.tri.Face()
+
+        self.assertIsNone(face.planar_axis())
+        self.assertIsNone(face.rotation_axis())
+        self.assertEqual(face.area(), 0.)
+        self.assertEqual(face.center().point, (0., 0., 0.))
+
+class Decimate(unittest.TestCase):
+    def setUp(self):
+        self.mesh = geom.tri.Mesh.FromArrays(*_box_arrays())
+
+    def test_box(self):
+        decimation = self.mesh.decimate(24)
+        coarse = decimation.mesh
+        check = coarse.check()
+
+        self.assertEqual(len(coarse.triangle_ids), 24)
+        self.assertTrue(check.valid)
+        self.assertAlmostEqual(check.volume, 1.)
+
+        # Every triangle is merged into a triangle on the same side of the box
+        numpy.testing.assert_allclose(coarse.normals[decimation.triangle_map], self.mesh.normals)
+
+        face = decimation.original_face(coarse.select_planar_face(coarse.triangle_ids[0]))
+
+        self.assertEqual(len(face.triangles), 128)
+        self.assertEqual(face.triangles, self.mesh.select_planar_face(coarse.triangle_ids[0]).triangles)
+
+    def test_ids(self):
+        decimation = self.mesh.decimate(100)
+
+        self.assertTrue(numpy.isin(decimation.mesh.triangle_ids, self.mesh.triangle_ids).all())
+        self.assertEqual(
+            decimation.original_ids(decimation.mesh.triangle_ids).tolist(),
+            self.mesh.triangle_ids.tolist()
+        )
+
+    def test_max_error(self):
+        decimation = self.mesh.decimate(0, max_error=1e-9)
+
+        self.assertEqual(len(decimation.mesh.triangle_ids), 12)
+        self.assertAlmostEqual(decimation.mesh.check().volume, 1.)
+
+class Check(unittest.TestCase):
+    def test_cube(self):
+        stl_mesh = stl_loader.load_from_file('cube.stl')
+        check = geom.tri.Mesh.FromSTL(stl_mesh, True).check()
+
+        self.assertTrue(check.watertight)
+        self.assertTrue(check.manifold)
+
+        # The bottom face of cube.stl is flipped
+        self.assertEqual(check.inconsistent_edges, 4)
+        self.assertFalse(check.valid)
+
+    def test_cylinder(self):
+        check = geom.tri.Mesh.FromArrays(*_cylinder_arrays()).check()
+
+        self.assertTrue(check.valid)
+        self.assertAlmostEqual(check.volume, 12 * 25. * math.sin(math.pi / 12.) * 10.)
+        numpy.testing.assert_allclose(check.centroid, [0., 0., 5.], atol=1e-9)
+        numpy.testing.assert_allclose(check.lower, [-5., -5., 0.])
+        numpy.testing.assert_allclose(check.upper, [5., 5., 10.])
+
+    def test_bowtie(self):
+        mesh = geom.tri.Mesh.FromArrays(
+            [(0., 0., 0.), (1., 0., 0.), (0., 1., 0.), (-1., 0., 0.), (0., -1., 0.), (5., 5., 5.)],
+            [(0, 1, 2), (0, 3, 4), (1, 1, 2)],
+            analyze_mesh=False
+        )
+        check = mesh.check()
+
+        self.assertEqual(check.boundary_edges, 6)
+        self.assertEqual(check.non_manifold_vertices, 1)
+        self.assertEqual(check.unused_vertices, 1)
+        self.assertEqual(check.degenerate_triangles, 1)
+        self.assertFalse(check.watertight)
+
+class FeatureEdges(unittest.TestCase):
+    def test_box(self):
+        mesh = geom.tri.Mesh.FromArrays(*_box_arrays())
+
+        edges, polylines = mesh.feature_edges(math.radians(30.))
+
+        self.assertEqual(len(edges), 12 * 8)
+        self.assertEqual(len(polylines), 12)
+
+        for line in polylines:
+            self.assertEqual(len(line), 9)
+            ends = mesh.positions[line[[0, -1]]]
+            self.assertTrue(numpy.all((ends == 0.) | (ends == 1.)))
+
+            steps = numpy.sort(numpy.stack((line[:-1], line[1:]), axis=1), axis=1)
+            self.assertTrue(numpy.all(numpy.isin(
+                steps[:, 0] * len(mesh.positions) + steps[:, 1],
+                mesh.topology.edge_vertices[edges] @ [len(mesh.positions), 1]
+            )))
+
+    def test_loops(self):
+        mesh = geom.tri.Mesh.FromArrays(*_cylinder_arrays())
+
+        edges, polylines = mesh.feature_edges(math.radians(30.))
+
+        self.assertEqual(len(edges), 48)
+        self.assertEqual(len(polylines), 2)
+        for line in polylines:
+            self.assertEqual(len(line), 25)
+            self.assertEqual(line[0], line[-1])
+
+        self.assertEqual(len(mesh.feature_edges(math.radians(100.), include_boundary=False)[0]), 0)
+
+    def test_boundary(self):
+        mesh = geom.tri.Mesh.FromArrays(
+            [(0., 0., 0.), (1., 0., 0.), (0., 1., 0.), (-1., 0., 0.), (0., -1., 0.)],
+            [(0, 1, 2), (0, 3, 4)]
+        )
+
+        edges, polylines = mesh.feature_edges(math.pi)
+
+        self.assertEqual(len(edges), 6)
+        self.assertEqual(sorted(line.tolist() for line in polylines), [[0, 1, 2, 0], [0, 3, 4, 0]])
+        self.assertEqual(len(mesh.feature_edges(math.pi, include_boundary=False)[0]), 0)
+
+class KRing(unittest.TestCase):
+    def test_cylinder(self):
+        mesh = geom.tri.Mesh.FromArrays(*_cylinder_arrays())
+
+        self.assertEqual(mesh.k_ring([72], 0).tolist(), [72])
+        self.assertEqual(mesh.k_ring([72], 1).tolist(), [24, 72, 73, 95])
+        self.assertEqual(len(mesh.k_ring([72], 100)), 96)
+
+    def test_ids(self):
+        positions, triangles = _cylinder_arrays()
+        mesh = geom.tri.Mesh.FromArrays(positions, triangles, triangle_ids=numpy.arange(96) + 1000)
+
+        self.assertEqual(mesh.k_ring([1072, 1000], 1).tolist(), [1000, 1024, 1025, 1048, 1072, 1073, 1095])
+
+class RayPicking(unittest.TestCase):
+    def setUp(self):
+        self.mesh = geom.tri.Mesh.FromArrays(*_cylinder_arrays())
+
+    def test_ray_intersect(self):
+        tri_id, point = self.mesh.ray_intersect(geom.Vertex(1., 0.5, 20.), geom.Vector(0., 0., -1.))
+
+        self.assertIn(tri_id, range(72, 96))
+        self.assertAlmostEqual(point.z, 10.)
+
+        tri_id, point = self.mesh.ray_intersect((20., 0.1, 5.), (-1., 0., 0.))
+
+        self.assertIn(tri_id, (0, 24))
+        self.assertAlmostEqual(point.y, 0.1)
+        self.assertGreater(point.x, 4.9)
+
+        self.assertIsNone(self.mesh.ray_intersect((20., 0., 5.), (1., 0., 0.)))
+
+    def test_ray_intersects(self):
+        origins = [[1., 0.5, 20.], [1., 0.5, -20.], [20., 20., 5.]]
+        directions = [[0., 0., -1.], [0., 0., 1.], [0., 0., 1.]]
+
+        ids, points = self.mesh.ray_intersects(origins, directions)
+
+        self.assertEqual(ids[2], -1)
+        self.assertTrue(numpy.all(numpy.isnan(points[2])))
+        numpy.testing.assert_allclose(points[:2], [[1., 0.5, 10.], [1., 0.5, 0.]], atol=1e-9)
+
+        for i in range(2):
+            self.assertEqual(self.mesh.ray_intersect(origins[i], directions[i])[0], ids[i])
+
+class ClosestPoints(unittest.TestCase):
+    def setUp(self):
+        self.mesh = geom.tri.Mesh.FromArrays(*_cylinder_arrays())
+
+    def test_closest_points(self):
+        ids, points, distance = self.mesh.closest_points([[1., 0.5, 12.], [1., 0.5, 5.], [0., 0., -3.]])
+
+        self.assertIn(ids[0], range(72, 96))
+        self.assertIn(ids[2], range(48, 72))
+        self.assertIn(ids[1], range(0, 48))
+
+        numpy.testing.assert_allclose(points[0], [1., 0.5, 10.])
+        numpy.testing.assert_allclose(distance[[0, 2]], [2., 3.])
+        self.assertLess(distance[1], 4.)
+
+    def test_brute_force(self):
+        rng = numpy.random.default_rng(0)
+        query = rng.uniform(-8., 15., (200, 3))
+
+        ids, points, distance = self.mesh.closest_points(query)
+
+        p = self.mesh.positions[self.mesh.triangle_vertices]
+        for q, d in zip(query, distance):
+            c = geom.tri._closest_on_triangles(numpy.tile(q, (len(p), 1)), p[:, 0], p[:, 1], p[:, 2])
+            self.assertAlmostEqual(numpy.linalg.norm(c - q, axis=1).min(), d)
+
+        numpy.testing.assert_allclose(numpy.linalg.norm(points - query, axis=1), distance)
+
+    def test_empty(self):
+        mesh = geom.tri.Mesh.FromArrays(numpy.zeros((0, 3)), numpy.zeros((0, 3), dtype=int))
+        ids, points, distance = mesh.closest_points([[0., 0., 0.]])
+
+        self.assertEqual(ids.tolist(), [-1])
+        self.assertTrue(numpy.all(numpy.isnan(points)))
+        self.assertEqual(distance[0], numpy.inf)
+
+class ParallelPlanes(unittest.TestCase):
+    def setUp(self):
+        self.mesh = geom.tri.Mesh.FromArrays(*_cylinder_arrays())
+
+    def test_caps(self):
+        top = self.mesh.triangles_in_parallel_plane(72)
+        both = self.mesh.triangles_in_parallel_plane(72, opposite=True)
+
+        self.assertEqual(sorted(t.id for t in top.triangles), list(range(72, 96)))
+        self.assertEqual(sorted(t.id for t in both.triangles), list(range(48, 96)))
+
+    def test_tree(self):
+        normals = self.mesh.normals
+        brute = geom.tri.NormalIndex(normals)
+
+        min_tree_size = geom.tri.NormalIndex.MIN_TREE_SIZE
+        geom.tri.NormalIndex.MIN_TREE_SIZE = 0
+        try:
+            tree = geom.tri.NormalIndex(normals)
+        finally:
+            geom.tri.NormalIndex.MIN_TREE_SIZE = min_tree_size
+
+        for t in (0, 30, 60):
+            for max_angle in (0.01, 0.3, 2.):
+                for opposite in (False, True):
+                    self.assertEqual(
+                        tree.query(normals[t], max_angle, opposite).tolist(),
+                        brute.query(normals[t], max_angle, opposite).tolist()
+                    )
+
+class GridHalfEdges(unittest.TestCase):
+    def setUp(self):
+        # 2 x 2 grid of squares, each split into two triangles
+        positions = [(x, y, 0.) for y in range(3) for x in range(3)]
+        triangles = []
+        for j in range(2):
+            for i in range(2):
+                v = 3 * j + i
+                triangles.extend([(v, v + 1, v + 4), (v, v + 4, v + 3)])
+
+        self.mesh = geom.tri.Mesh.FromArrays(positions, triangles)
+        self.he = self.mesh.half_edges
+
+    def test_twins(self):
+        twin = self.he.twin[self.he.twin >= 0]
+
+        self.assertEqual(len(twin), 16)
+        numpy.testing.assert_array_equal(self.he.twin[twin], numpy.flatnonzero(self.he.twin >= 0))
+        self.assertEqual(sorted(self.he.neighbors(0)), [1, 3])
+
+    def test_lazy(self):
+        mesh = geom.tri.Mesh.FromArrays(self.mesh.positions, self.mesh.triangle_vertices)
+
+        self.assertEqual(sorted(t.id for t, _ in mesh.get_neighbored_triangles(0)), [1, 3])
+        self.assertFalse(any(name.startswith('half_edges.') for name in mesh.analysis_arrays()))
+
+        numpy.testing.assert_array_equal(mesh.half_edges.twin, self.he.twin)
+
+    def test_one_ring(self):
+        self.assertEqual(self.he.vertex_triangles(4), [0, 1, 4, 7, 6, 3])
+        self.assertEqual(sorted(self.he.one_ring(4)), [0, 1, 3, 5, 7, 8])
+        self.assertEqual(sorted(self.he.one_ring(0)), [1, 3, 4])
+        self.assertEqual(self.he.vertex_triangles(2), [2])
+
+    def test_boundary_loops(self):
+        loops = self.he.boundary_loops()
+
+        self.assertEqual(len(loops), 1)
+        self.assertEqual(sorted(loops[0].tolist()), [0, 1, 2, 3, 5, 6, 7, 8])
+
+    def test_closed(self):
+        stl_mesh = stl_loader.load_from_file('cube.stl')
+        cube = geom.tri.Mesh.FromSTL(stl_mesh, True)
+
+        self.assertEqual(cube.half_edges.boundary_loops(), [])
+        self.assertTrue(numpy.all(cube.half_edges.twin >= 0))
+
+class TriangleIds(unittest.TestCase):
+    def setUp(self):
+        stl_mesh = stl_loader.load_from_file('shelf_bracket.stl')
+        self.mesh = geom.tri.Mesh.FromSTL(stl_mesh, True)
+
+    def test_lookup(self):
+        ids = numpy.array([275, 0, 300, 12])
+
+        self.assertEqual(self.mesh.triangle_indices(ids).tolist(), [275, 0, -1, 12])
+
+        with self.assertRaises(geom.tri.MeshException):
+            self.mesh.select_planar_face(300)
+
+    def test_sparse_ids(self):
+        mesh = geom.tri.Mesh.FromArrays(
+            self.mesh.positions,
+            self.mesh.triangle_vertices,
+            triangle_ids=1000 * self.mesh.triangle_ids + 7
+        )
+
+        self.assertEqual(mesh.triangle_indices([7, 3007, 3008]).tolist(), [0, 3, -1])
+        self.assertEqual(len(mesh.face_from_ids([7, 3007, 3008]).triangles), 2)
+
+    def test_bulk_selection(self):
+        ids = numpy.arange(len(self.mesh.triangles))
+
+        faces = self.mesh.select_planar_faces(ids)
+
+        self.assertEqual(len(faces), len(ids))
+
+        for tid in (0, 5, 100, 275):
+            expected = {t.id for t in self.mesh.select_planar_face(tid).triangles}
+            self.assertEqual({t.id for t in faces[tid].triangles}, expected)
+
+        concave = self.mesh.select_concave_faces([3])
+        self.assertEqual(concave[0].triangles, self.mesh.select_concave_face(3).triangles)
@@ -0,0 +1,36 @@
+import unittest
+import numpy
+
+from pywim import indexing
+
+class IdIndexTest(unittest.TestCase):
+    def test_dense(self):
+        index = indexing.IdIndex(numpy.array([3, 1, 2, 1]))
+
+        self.assertIsNotNone(index._dense)
+        self.assertEqual(index.find([1, 2, 3, 0, 7, -1]).tolist(), [1, 2, 0, -1, -1, -1])
+
+    def test_sorted(self):
+        index = indexing.IdIndex(numpy.array([1000, -5, 70, -5]))
+
+        self.assertIsNone(index._dense)
+        self.assertEqual(index.find([-5, 70, 1000, 71, 2000]).tolist(), [1, 2, 0, -1, -1])
+
+    def test_empty(self):
+        self.assertEqual(indexing.IdIndex(numpy.empty(0, dtype=numpy.int64)).find([0, 1]).tolist(), [-1, -1])
+
+class MortonCodesTest(unittest.TestCase):
+    def test_order(self):
+        points = numpy.array([[1., 1., 0.], [0., 0., 0.], [1., 0., 0.], [0., 1., 0.]])
+
+        self.assertEqual(numpy.argsort(indexing.morton_codes(points)).tolist(), [1, 3, 2, 0])
+
+    def test_uniform(self):
+        # A long strip is ordered along its length only in a uniform grid
+        points = numpy.array([[x, y, 0.] for y in (0., 1.) for x in range(8)])
+
+        order = numpy.argsort(indexing.morton_codes(points, uniform=True), kind='stable')
+        self.assertLessEqual(numpy.abs(numpy.diff(points[order, 0])).max(), 1.)
+
+        order = numpy.argsort(indexing.morton_codes(points), kind='stable')
+        self.assertGreater(numpy.abs(numpy.diff(points[order, 0])).max(), 1.)
@@ -0,0 +1,58 @@
+import unittest
+from unittest import mock
+
+from pywim.fea import model
+import pywim.vtk as pvtk
+
+@unittest.skipUnless(pvtk.VTK_MODULE_EXISTS, 'needs vtk')
+class GridFromArraysTest(unittest.TestCase):
+    def setUp(self):
+        self.mesh = model.Mesh()
+
+        for i in range(8):
+            self.mesh.nodes.append(model.Node(i + 1, float(i % 2), float((i // 2) % 2), float(i // 4)))
+
+        hexes = model.ElementGroup('HEXL8')
+        hexes.connectivity.append(model.Element(1, [1, 2, 4, 3, 5, 6, 8, 7]))
+        self.mesh.elements.append(hexes)
+
+        quads = model.ElementGroup('PSL4', 0.5)
+        quads.connectivity.append(model.Element(2, [1, 2, 4, 3]))
+        quads.connectivity.append(model.Element(3, [5, 6, 8, 7]))
+        self.mesh.elements.append(quads)
+
+    def cells(self, grid):
+        cells = []
+        for c in range(grid.GetNumberOfCells()):
+            ids = grid.GetCell(c).GetPointIds()
+            cells.append((grid.GetCellType(c), [ids.GetId(i) for i in range(ids.GetNumberOfIds())]))
+        return cells
+
+    def test_same_as_objects(self):
+        expected, nels = pvtk._grid_from_objects(self.mesh)
+
+        grid = pvtk.grid_from_arrays(model.ArrayMesh.FromMesh(self.mesh))
+
+        self.assertEqual(grid.GetNumberOfCells(), nels)
+        self.assertEqual(self.cells(grid), self.cells(expected))
+
+        for p in range(expected.GetNumberOfPoints()):
+            self.assertEqual(grid.GetPoint(p), expected.GetPoint(p))
+
+    def test_legacy_cells(self):
+        expected = pvtk.grid_from_arrays(model.ArrayMesh.FromMesh(self.mesh))
+
+        with mock.patch.object(pvtk, '_VTK_LEGACY_CELLS', True):
+            grid = pvtk.grid_from_arrays(model.ArrayMesh.FromMesh(self.mesh))
+
+        self.assertEqual(self.cells(grid), self.cells(expected))
+
+    def test_unordered_ids(self):
+        mesh = model.ArrayMesh.FromMesh(self.mesh)
+        mesh.nodes = model.NodeArray(mesh.nodes.ids[::-1].copy(), mesh.nodes.coordinates[::-1].copy())
+
+        grid = pvtk.grid_from_arrays(mesh)
+
+        self.assertEqual(grid.GetNumberOfPoints(), 8)
+        self.assertEqual(grid.GetPoint(7), (1., 1., 1.))
+        self.assertEqual(self.cells(grid)[1], (pvtk.vtk.VTK_QUAD, [0, 1, 3, 2]))